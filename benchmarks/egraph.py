@@ -0,0 +1,159 @@
+import sys
+import json
+import time
+import platform
+import subprocess
+import typing
+from typing import Annotated, Optional
+import tyro
+from apyds import Rule
+from ddss.egraph import Search
+
+
+def chain(n: int) -> tuple[list[str], list[str]]:
+    # a0 == a1 == ... == an, 询问两端是否相等
+    facts = [f"----\n(binary == a{i} a{i + 1})\n" for i in range(n)]
+    ideas = [f"----\n(binary == a0 a{n})\n"]
+    return facts, ideas
+
+
+def congruence(n: int, depth: int = 8) -> tuple[list[str], list[str]]:
+    # x == y, 询问 n 个不同的 g_i (f^depth x) == g_i (f^depth y)
+    # 项的文本长度受到默认缓冲区大小的限制, 因此以宽度而非深度来扩大规模
+    lhs, rhs = "x", "y"
+    for _ in range(depth):
+        lhs, rhs = f"(f {lhs})", f"(f {rhs})"
+    facts = ["----\n(binary == x y)\n"]
+    ideas = [f"----\n(binary == (g{i} {lhs}) (g{i} {rhs}))\n" for i in range(n)]
+    return facts, ideas
+
+
+def variables(n: int) -> tuple[list[str], list[str]]:
+    # 大量事实与含变量的想法
+    facts = [f"----\n(p c{i})\n" for i in range(n)] + [f"----\n(binary == (q c{i}) (p c{i}))\n" for i in range(n)]
+    ideas = ["----\n(p `x)\n", "----\n(q `x)\n"]
+    return facts, ideas
+
+
+def eclass(n: int) -> tuple[list[str], list[str]]:
+    # 所有常量都在同一个等价类中
+    facts = [f"----\n(binary == c0 c{i + 1})\n" for i in range(n)]
+    ideas = [f"----\n(binary == c{n} `x)\n"]
+    return facts, ideas
+
+
+workloads: dict[str, typing.Callable[[int], tuple[list[str], list[str]]]] = {
+    "chain": chain,
+    "congruence": congruence,
+    "variables": variables,
+    "eclass": eclass,
+}
+
+
+def measure(workload: str, scale: int) -> dict[str, typing.Any]:
+    facts, ideas = workloads[workload](scale)
+    facts = [Rule(fact) for fact in facts]
+    ideas = [Rule(idea) for idea in ideas]
+    search = Search()
+
+    begin = time.perf_counter()
+    for fact in facts:
+        search.add(fact)
+    added = time.perf_counter()
+    search.rebuild()
+    rebuilt = time.perf_counter()
+    results = sum(len(list(search.execute(idea))) for idea in ideas)
+    executed = time.perf_counter()
+
+    return {
+        "workload": workload,
+        "scale": scale,
+        "add": added - begin,
+        "rebuild": rebuilt - added,
+        "execute": executed - rebuilt,
+        "results": results,
+    }
+
+
+def commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(
+    workload: Annotated[
+        list[str],
+        tyro.conf.arg(
+            aliases=["-w"],
+            help="Workloads to run: chain, congruence, variables, eclass.",
+        ),
+    ] = list(workloads),
+    scale: Annotated[
+        list[int],
+        tyro.conf.arg(
+            aliases=["-s"],
+            help="Sizes of each workload.",
+        ),
+    ] = [10, 100, 300],
+    repeat: Annotated[
+        int,
+        tyro.conf.arg(
+            help="Number of runs per workload and size. The fastest run of each phase is reported.",
+        ),
+    ] = 3,
+    output: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            aliases=["-o"],
+            help="Write the results as JSON to this file.",
+        ),
+    ] = None,
+    baseline: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            help="JSON results of an earlier run to compare with.",
+        ),
+    ] = None,
+) -> None:
+    """Micro-benchmarks of the e-graph search engine used by egg."""
+    for name in workload:
+        if name not in workloads:
+            print(f"error: unsupported workload: '{name}'")
+            return
+
+    results = []
+    for name in workload:
+        for size in scale:
+            runs = [measure(name, size) for _ in range(repeat)]
+            result = runs[0] | {phase: min(run[phase] for run in runs) for phase in ("add", "rebuild", "execute")}
+            results.append(result)
+
+    previous = {}
+    if baseline is not None:
+        with open(baseline) as file:
+            previous = {(result["workload"], result["scale"]): result for result in json.load(file)["results"]}
+
+    for result in results:
+        line = f"{result['workload']:>10} {result['scale']:>6}"
+        for phase in ("add", "rebuild", "execute"):
+            line += f"  {phase} {result[phase] * 1000:9.3f}ms"
+            if (old := previous.get((result["workload"], result["scale"]))) is not None and old[phase] > 0:
+                line += f" ({result[phase] / old[phase]:5.2f}x)"
+        print(line)
+
+    if output is not None:
+        report = {
+            "commit": commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "results": results,
+        }
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    tyro.cli(main, prog="benchmarks/egraph.py")
@@ -0,0 +1,248 @@
+import sys
+import json
+import shlex
+import asyncio
+import tempfile
+import pathlib
+import typing
+from typing import Annotated, Optional
+import tyro
+from sqlalchemy import select
+from ddss.orm import initialize_database, count_rows, Base, Facts
+from ddss.main import normalize_addr
+
+# 工作负载定义在同一目录下的 saturation.py 中, 从任意目录运行或被加载时都能找到它
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+from saturation import workloads  # noqa: E402
+
+components = ("load", "ds", "egg", "dump")
+
+
+def parse_setup(spec: str) -> dict[str, str]:
+    # "py" 表示全部使用 Python 实现, "py,egg=ts" 表示只有 egg 使用 TypeScript 实现
+    default = None
+    setup = {}
+    for part in spec.split(","):
+        if "=" in part:
+            component, implementation = part.split("=", 1)
+            setup[component] = implementation
+        else:
+            default = part
+    return {component: setup.get(component, default) for component in components}
+
+
+async def execute(
+    setup: dict[str, str],
+    lines: list[str],
+    addr: str,
+    commands: dict[str, list[str]],
+    startup: float,
+    quiet: float,
+    timeout: float,
+) -> dict[str, typing.Any]:
+    normalized = normalize_addr(addr)
+    engine, session = await initialize_database(normalized)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async def count() -> int:
+        async with session() as sess:
+            return await count_rows(sess, Facts)
+
+    def command(component: str) -> list[str]:
+        return [*commands[setup[component]], "-a", addr, "-c", component]
+
+    loop = asyncio.get_running_loop()
+    try:
+        begin = loop.time()
+        process = await asyncio.create_subprocess_exec(
+            *command("load"), stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.DEVNULL
+        )
+        await process.communicate("".join(f"{line}\n" for line in lines).encode())
+        load = loop.time() - begin
+        loaded = await count()
+
+        # 只有 Python 实现有 --saturate 批处理模式, TypeScript 实现没有. 为了两边以同样的方式计时,
+        # 轮询事实数目, 在启动之后一段时间内不再变化时认为达到不动点
+        begin = loop.time()
+        processes = [
+            await asyncio.create_subprocess_exec(*command(component), stdout=asyncio.subprocess.DEVNULL)
+            for component in ("ds", "egg")
+        ]
+        facts = loaded
+        first = None
+        last = begin
+        while (now := loop.time()) - max(last, begin + startup) < quiet and now - begin < timeout:
+            await asyncio.sleep(0.05)
+            if (current := await count()) != facts:
+                facts = current
+                last = loop.time()
+                if first is None:
+                    first = last - begin
+        for process in processes:
+            process.terminate()
+            await process.wait()
+        fixpoint = last - begin
+
+        begin = loop.time()
+        process = await asyncio.create_subprocess_exec(*command("dump"), stdout=asyncio.subprocess.PIPE)
+        dumped, _ = await process.communicate()
+        dump = loop.time() - begin
+
+        async with session() as sess:
+            data = sorted(await sess.scalars(select(Facts.data)))
+    finally:
+        await engine.dispose()
+
+    return {
+        "setup": ",".join(f"{component}={setup[component]}" for component in components),
+        "load": load,
+        "first": first,
+        "fixpoint": fixpoint,
+        "dump": dump,
+        "facts": len(data),
+        "derived_per_second": (len(data) - loaded) / fixpoint if fixpoint > 0 else 0.0,
+        "dumped": dumped.decode().count("fact:"),
+        "data": data,
+    }
+
+
+async def compare(
+    workload: str,
+    scale: int,
+    fanout: int,
+    setups: list[str],
+    addr: Optional[str],
+    commands: dict[str, list[str]],
+    startup: float,
+    quiet: float,
+    timeout: float,
+) -> list[dict[str, typing.Any]]:
+    lines = workloads[workload](scale, fanout)
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        target = addr or f"sqlite:///{(pathlib.Path(tmpdir) / 'parity.db').as_posix()}"
+        for spec in setups:
+            result = await execute(parse_setup(spec), lines, target, commands, startup, quiet, timeout)
+            results.append({"workload": workload, "scale": scale} | result)
+    return results
+
+
+def main(
+    setup: Annotated[
+        list[str],
+        tyro.conf.arg(
+            help="Deployments to compare. 'py' and 'ts' run every component in one implementation, 'py,egg=ts' overrides single components.",
+        ),
+    ] = ["py", "ts"],
+    workload: Annotated[
+        list[str],
+        tyro.conf.arg(
+            aliases=["-w"],
+            help="Workloads to run: closure, rewrite, chain.",
+        ),
+    ] = list(workloads),
+    scale: Annotated[
+        list[int],
+        tyro.conf.arg(
+            aliases=["-s"],
+            help="Sizes of each workload.",
+        ),
+    ] = [5, 10],
+    fanout: Annotated[
+        int,
+        tyro.conf.arg(
+            help="Successors of each rule in the chain workload.",
+        ),
+    ] = 1,
+    addr: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            aliases=["-a"],
+            help="Database address URL shared by both implementations. All tables in it are dropped before each run. A temporary SQLite file is used if not provided.",
+        ),
+    ] = None,
+    python_command: Annotated[
+        str,
+        tyro.conf.arg(
+            help="Command running the Python implementation.",
+        ),
+    ] = f"{shlex.quote(sys.executable)} -m ddss.main",
+    typescript_command: Annotated[
+        str,
+        tyro.conf.arg(
+            help="Command running the TypeScript implementation.",
+        ),
+    ] = "node dist/index.js",
+    startup: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Seconds allowed for the engine processes to start before the quiet period is counted.",
+        ),
+    ] = 3.0,
+    quiet: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Seconds without new facts after which the engines are considered saturated.",
+        ),
+    ] = 2.0,
+    timeout: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Seconds after which the engines are stopped even if they are still deriving facts.",
+        ),
+    ] = 120.0,
+    output: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            aliases=["-o"],
+            help="Write the results as JSON to this file.",
+        ),
+    ] = None,
+) -> None:
+    """Run the same workload through the Python and TypeScript implementations and compare results and speed."""
+    for name in workload:
+        if name not in workloads:
+            print(f"error: unsupported workload: '{name}'")
+            return
+    if addr is not None and normalize_addr(addr) is None:
+        print(f"error: unsupported database: '{addr}'")
+        return
+    commands = {"py": shlex.split(python_command), "ts": shlex.split(typescript_command)}
+    for spec in setup:
+        if unknown := set(parse_setup(spec).values()) - commands.keys():
+            print(f"error: unsupported implementation: '{', '.join(sorted(map(str, unknown)))}'")
+            return
+
+    results = []
+    mismatches = 0
+    for name in workload:
+        for size in scale:
+            group = asyncio.run(compare(name, size, fanout, setup, addr, commands, startup, quiet, timeout))
+            reference = group[0]["data"]
+            for result in group:
+                identical = result["data"] == reference and result["dumped"] == result["facts"]
+                mismatches += not identical
+                first = f"{result['first']:7.3f}s" if result["first"] is not None else "      -"
+                print(
+                    f"{name:>8} {size:>5} {result['setup']:>32}"
+                    f"  load {result['load']:7.3f}s  first {first}  fixpoint {result['fixpoint']:7.3f}s"
+                    f"  dump {result['dump']:7.3f}s  facts {result['facts']:>6} {result['derived_per_second']:8.1f}/s"
+                    f"  {'identical' if identical else 'DIFFERENT'}"
+                )
+                if not identical:
+                    missing = sorted(set(reference) - set(result["data"]))[:3]
+                    extra = sorted(set(result["data"]) - set(reference))[:3]
+                    print(f"    missing: {missing}\n    extra: {extra}")
+            results += group
+
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump({"python": sys.version.split()[0], "results": results}, file, indent=2)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    tyro.cli(main, prog="benchmarks/parity.py")
@@ -0,0 +1,41 @@
+import hashlib
+from collections import OrderedDict
+
+
+def digest(table: str, data: str) -> bytes:
+    return hashlib.blake2b(f"{table}\0{data}".encode(), digest_size=16).digest()
+
+
+class Cache:
+    def __init__(self, capacity: int = 65536) -> None:
+        self.capacity: int = capacity
+        self.entries: OrderedDict[bytes, None] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def _insert(self, key: bytes) -> None:
+        self.entries[key] = None
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def add(self, table: str, data: str) -> None:
+        self._insert(digest(table, data))
+
+    def contains(self, table: str, data: str) -> bool:
+        # 未命中时不加入缓存, 写入提交成功之后再调用 add, 以免失败的写入永远不再重试
+        key = digest(table, data)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self, name: str) -> str:
+        return f"{name}: cache hit rate {self.hit_rate:.1%} ({self.hits}/{self.hits + self.misses})"
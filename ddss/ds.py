@@ -1,44 +1,194 @@
 import asyncio
-from sqlalchemy import select
-from apyds import Search
-from .orm import initialize_database, insert_or_ignore, Facts, Ideas
+import itertools
+import collections
+from apyds import Search, Rule
+from .orm import initialize_database, fetch_after, insert_or_ignore_many, Facts, Ideas, Quarantine
 from .utility import str_rule_get_str_idea
+from .cache import Cache
+from .lease import Lease
+from .fixpoint import Monitor
+from .limit import Limits
+from .metrics import Metrics
+from .profiling import Profiler, section
+from .trace import Tracer
+from .heap import HeapReport
+from .schedule import Scheduler
 
 
-async def main(addr, engine=None, session=None):
+async def main(
+    addr,
+    engine=None,
+    session=None,
+    cache_size=65536,
+    lease: Lease | None = None,
+    monitor: Monitor | None = None,
+    goal_directed=False,
+    budget=0,
+    limits: Limits | None = None,
+    quarantine=False,
+    metrics: Metrics | None = None,
+    profiler: Profiler | None = None,
+    tracer: Tracer | None = None,
+    heap: HeapReport | None = None,
+    scheduler: Scheduler | None = None,
+):
     if engine is None or session is None:
         engine, session = await initialize_database(addr)
+    if scheduler is None:
+        scheduler = Scheduler()
 
+    cache = Cache(cache_size)
     try:
-        search = Search()
+        search = Search() if limits is None or limits.buffer is None else Search(limit_size=limits.buffer)
         max_fact = -1
+        max_idea = -1
+        # 跳过的行号及其所在分区
+        skipped = {}
+        goals = []
+        pending = {}
+        rules = 0
+        if heap is not None:
+            # 搜索引擎的内部状态不可见, 因此统计加入其中的规则数目
+            heap.register(
+                "ds",
+                lambda: {
+                    "rules": rules,
+                    "pending": len(pending),
+                    "goals": len(goals),
+                    "skipped": len(skipped),
+                    "cache": len(cache.entries),
+                },
+            )
 
         while True:
             begin = asyncio.get_running_loop().time()
+            stamps = [("", begin)]
+            released = []
+            changed = lease is not None and await lease.renew(session)
 
             async with session() as sess:
-                for i in await sess.scalars(select(Facts).where(Facts.id > max_fact)):
-                    max_fact = max(max_fact, i.id)
-                    search.add(i.data)
-                tasks = []
+                rows = []
+                if changed and lease.lost:
+                    # 失去了部分分区, 搜索引擎无法移除规则, 因此清空后重新加入仍然拥有的规则
+                    search.reset()
+                    rules = 0
+                    pending.clear()
+                    skipped.clear()
+                    rows += [i for i in await fetch_after(sess, Facts, -1) if i.id <= max_fact]
+                elif changed and not lease.gained.isdisjoint(skipped.values()):
+                    # 获得了含有之前跳过的规则的分区, 只重新检查这些规则
+                    rows += [
+                        i
+                        for i in await fetch_after(sess, Facts, -1)
+                        if i.id <= max_fact and skipped.get(i.id) in lease.gained
+                    ]
+                rows += await fetch_after(sess, Facts, max_fact)
+                if goal_directed:
+                    for i in await fetch_after(sess, Ideas, max_idea):
+                        max_idea = max(max_idea, i.id)
+                        goal = Rule(i.data).conclusion
+                        goals.append(goal)
+                        # 新的想法可能使之前暂缓的规则变得相关
+                        for data in [data for data, conclusion in pending.items() if conclusion @ goal]:
+                            del pending[data]
+                            rules += 1
+                            search.add(data)
+                    # 在预算内按顺序放行暂缓的规则, 以保证最终仍然能够饱和
+                    released = list(itertools.islice(pending, budget))
+                    for data in released:
+                        del pending[data]
+                        rules += 1
+                        search.add(data)
+                stamps.append(("fetch", asyncio.get_running_loop().time()))
+                with section(profiler, "ds"):
+                    for i in rows:
+                        max_fact = max(max_fact, i.id)
+                        cache.add(Facts.__tablename__, i.data)
+                        # 事实由所有进程共享, 含有前提的规则只由其所在分区的进程处理.
+                        # 搜索引擎会继续展开自己推导出的规则, 因此推导出的规则还会被其分区的进程再展开一次
+                        if lease is not None and not i.data.startswith("--") and not lease.owns(i.data):
+                            skipped[i.id] = lease.partition(i.data)
+                            continue
+                        skipped.pop(i.id, None)
+                        # 目标导向模式下, 结论无法与任何想法合一的规则暂缓加入
+                        if goal_directed and not i.data.startswith("--"):
+                            conclusion = Rule(i.data).conclusion
+                            if not any(conclusion @ goal for goal in goals):
+                                pending[i.data] = conclusion
+                                continue
+                        rules += 1
+                        search.add(i.data)
+                stamps.append(("add", asyncio.get_running_loop().time()))
+                staged = {}
+                written = collections.Counter()
+                hits = cache.hits
+
+                def submit(model, data):
+                    if data in staged.get(model, ()) or cache.contains(model.__tablename__, data):
+                        return
+                    staged.setdefault(model, {})[data] = None
+                    written[model.__tablename__] += 1
 
                 def handler(rule):
                     ds = str(rule)
-                    tasks.append(asyncio.create_task(insert_or_ignore(sess, Facts, ds)))
+                    # 超出规模限制的规则不写入事实表, 可选地放入隔离表
+                    if limits and limits.check(ds) is not None:
+                        if quarantine:
+                            submit(Quarantine, ds)
+                        return False
+                    submit(Facts, ds)
                     if idea := str_rule_get_str_idea(ds):
-                        tasks.append(asyncio.create_task(insert_or_ignore(sess, Ideas, idea)))
+                        submit(Ideas, idea)
                     return False
 
-                count = search.execute(handler)
-                await asyncio.gather(*tasks)
+                with section(profiler, "ds"):
+                    count = search.execute(handler)
+                stamps.append(("execute", asyncio.get_running_loop().time()))
+                # 每轮的结论按表一次性写入, 不在同一个会话上并发执行
+                added = collections.Counter()
+                for model, data in staged.items():
+                    added[model.__tablename__] += await insert_or_ignore_many(sess, model, data)
+                inserted = sum(added.values())
+                stamps.append(("insert", asyncio.get_running_loop().time()))
                 await sess.commit()
+                for model, data in staged.items():
+                    for item in data:
+                        cache.add(model.__tablename__, item)
 
             end = asyncio.get_running_loop().time()
+            stamps.append(("commit", end))
             duration = end - begin
-            if count == 0:
-                delay = max(0, 0.1 - duration)
-                await asyncio.sleep(delay)
+            if metrics is not None:
+                metrics.inc("ddss_rows_read_total", len(rows), component="ds", table=Facts.__tablename__)
+                for table, value in written.items():
+                    metrics.inc("ddss_rows_written_total", value, component="ds", table=table)
+                    metrics.inc("ddss_rows_inserted_total", added[table], component="ds", table=table)
+                metrics.inc("ddss_duplicates_total", cache.hits - hits, component="ds")
+                metrics.phases("ds", stamps)
+            if tracer is not None:
+                tracer.phases(
+                    "ds",
+                    stamps,
+                    fetch={"rows": len(rows)},
+                    execute={"count": count},
+                    insert={"rows": inserted},
+                )
+            if profiler is not None:
+                profiler.iteration("ds")
+            # 只有实际插入的行才算进展, 暂缓的规则尚未全部放行时也未达到不动点
+            progress = inserted + (len(pending) if released else 0)
+            if monitor is not None:
+                monitor.report("ds", begin, progress)
+            await scheduler.pause("ds", session, duration, progress, len(rows), inserted)
     except asyncio.CancelledError:
         pass
     finally:
+        if lease is not None:
+            async with session() as sess:
+                await lease.release(sess)
+                await sess.commit()
+        if cache.capacity:
+            print(cache.report("ds"))
+        if limits:
+            print(limits.report("ds"))
         await engine.dispose()
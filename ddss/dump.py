@@ -1,17 +1,25 @@
-from sqlalchemy import select
 from apyds_bnf import unparse
-from .orm import initialize_database, Facts, Ideas
+from .orm import initialize_database, fetch_after, load_cursor, save_cursor, Facts, Ideas
 
 
-async def main(addr, engine=None, session=None):
+async def main(addr, engine=None, session=None, cursor: str | None = None):
     if engine is None or session is None:
         engine, session = await initialize_database(addr)
 
     try:
         async with session() as sess:
-            for i in await sess.scalars(select(Ideas)):
+            max_fact = -1
+            max_idea = -1
+            if cursor is not None:
+                max_fact, max_idea = await load_cursor(sess, cursor)
+            for i in await fetch_after(sess, Ideas, max_idea):
+                max_idea = max(max_idea, i.id)
                 print("idea:", unparse(i.data))
-            for f in await sess.scalars(select(Facts)):
+            for f in await fetch_after(sess, Facts, max_fact):
+                max_fact = max(max_fact, f.id)
                 print("fact:", unparse(f.data))
+            if cursor is not None:
+                await save_cursor(sess, cursor, max_fact, max_idea)
+                await sess.commit()
     finally:
         await engine.dispose()
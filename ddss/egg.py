@@ -1,52 +1,195 @@
 import asyncio
-from sqlalchemy import select
+import collections
 from apyds import Rule
-from .orm import initialize_database, insert_or_ignore, Facts, Ideas
+from .orm import initialize_database, fetch_after, insert_or_ignore_many, Facts, Ideas, Quarantine
 from .egraph import Search
+from .cache import Cache, digest
+from .lease import Lease
+from .fixpoint import Monitor
+from .limit import Limits
+from .metrics import Metrics
+from .profiling import Profiler, section
+from .trace import Tracer
+from .heap import HeapReport
+from .schedule import Scheduler
 
 
-async def main(addr, engine=None, session=None):
+async def main(
+    addr,
+    engine=None,
+    session=None,
+    cache_size=65536,
+    lease: Lease | None = None,
+    monitor: Monitor | None = None,
+    limits: Limits | None = None,
+    quarantine=False,
+    metrics: Metrics | None = None,
+    profiler: Profiler | None = None,
+    tracer: Tracer | None = None,
+    heap: HeapReport | None = None,
+    scheduler: Scheduler | None = None,
+):
     if engine is None or session is None:
         engine, session = await initialize_database(addr)
+    if scheduler is None:
+        scheduler = Scheduler()
 
+    cache = Cache(cache_size)
     try:
         search = Search()
         pool = []
         max_fact = -1
         max_idea = -1
+        # 跳过的行号及其所在分区
+        skipped = {}
+        # 已经超出规模限制的事实的摘要, 想法每轮重复产生它们时不再检查和计数
+        rejected = set()
+        if heap is not None:
+            heap.register(
+                "egg",
+                lambda: {
+                    "terms": len(search.terms),
+                    "facts": len(search.facts),
+                    "fact_matching_cache": sum(map(len, search.fact_matching_cache.values())),
+                    "mapping": len(search.egraph.mapping),
+                    "eclasses": len(search.egraph.core.classes),
+                    "pool": len(pool),
+                    "cache": len(cache.entries),
+                    "rejected": len(rejected),
+                },
+            )
 
         while True:
             count = 0
             begin = asyncio.get_running_loop().time()
+            stamps = [("", begin)]
+
+            changed = lease is not None and await lease.renew(session)
 
             async with session() as sess:
-                for i in await sess.scalars(select(Ideas).where(Ideas.id > max_idea)):
+                rows = []
+                if changed and lease.lost:
+                    # 失去了部分分区, 重新建立只含仍然拥有的想法的待处理列表
+                    pool = []
+                    skipped.clear()
+                    rows += [i for i in await fetch_after(sess, Ideas, -1) if i.id <= max_idea]
+                elif changed and not lease.gained.isdisjoint(skipped.values()):
+                    # 获得了含有之前跳过的想法的分区, 只重新检查这些想法
+                    rows += [
+                        i
+                        for i in await fetch_after(sess, Ideas, -1)
+                        if i.id <= max_idea and skipped.get(i.id) in lease.gained
+                    ]
+                rows += await fetch_after(sess, Ideas, max_idea)
+                for i in rows:
                     max_idea = max(max_idea, i.id)
+                    # 每个进程维护全部事实, 但只处理其所在分区的想法
+                    if lease is not None and not lease.owns(i.data):
+                        skipped[i.id] = lease.partition(i.data)
+                        continue
+                    skipped.pop(i.id, None)
                     pool.append(Rule(i.data))
-                for i in await sess.scalars(select(Facts).where(Facts.id > max_fact)):
-                    max_fact = max(max_fact, i.id)
-                    search.add(Rule(i.data))
-                search.rebuild()
-                tasks = []
-                next_pool = []
-                for i in pool:
-                    for o in search.execute(i):
-                        tasks.append(asyncio.create_task(insert_or_ignore(sess, Facts, str(o))))
-                        count += 1
-                        if i == o:
-                            break
-                    else:
-                        next_pool.append(i)
-                pool = next_pool
-                await asyncio.gather(*tasks)
+                stamps.append(("fetch_ideas", asyncio.get_running_loop().time()))
+                facts = await fetch_after(sess, Facts, max_fact)
+                stamps.append(("fetch_facts", asyncio.get_running_loop().time()))
+                with section(profiler, "egg"):
+                    for i in facts:
+                        max_fact = max(max_fact, i.id)
+                        search.add(Rule(i.data))
+                        cache.add(Facts.__tablename__, i.data)
+                stamps.append(("add", asyncio.get_running_loop().time()))
+                with section(profiler, "egg"):
+                    search.rebuild()
+                stamps.append(("rebuild", asyncio.get_running_loop().time()))
+                staged = {}
+                written = collections.Counter()
+                hits = cache.hits
+
+                def submit(model, data):
+                    if data in staged.get(model, ()) or cache.contains(model.__tablename__, data):
+                        return False
+                    staged.setdefault(model, {})[data] = None
+                    written[model.__tablename__] += 1
+                    return True
+
+                with section(profiler, "egg"):
+                    next_pool = []
+                    for i in pool:
+                        started, produced = asyncio.get_running_loop().time(), count
+                        for o in search.execute(i):
+                            fact = str(o)
+                            # 超出规模限制的项不写入事实表, 可选地放入隔离表
+                            if limits and (key := digest(Quarantine.__tablename__, fact)) in rejected:
+                                pass
+                            elif limits and limits.check(fact) is not None:
+                                rejected.add(key)
+                                if quarantine:
+                                    submit(Quarantine, fact)
+                            elif submit(Facts, fact):
+                                count += 1
+                            if i == o:
+                                break
+                        else:
+                            next_pool.append(i)
+                        if tracer is not None:
+                            tracer.span(
+                                "egg",
+                                "execute_idea",
+                                started,
+                                asyncio.get_running_loop().time(),
+                                facts=count - produced,
+                            )
+                    pool = next_pool
+                stamps.append(("execute", asyncio.get_running_loop().time()))
+                # 每轮的结论按表一次性写入, 不在同一个会话上并发执行
+                added = collections.Counter()
+                for model, data in staged.items():
+                    added[model.__tablename__] += await insert_or_ignore_many(sess, model, data)
+                inserted = sum(added.values())
+                stamps.append(("insert", asyncio.get_running_loop().time()))
                 await sess.commit()
+                for model, data in staged.items():
+                    for item in data:
+                        cache.add(model.__tablename__, item)
 
             end = asyncio.get_running_loop().time()
+            stamps.append(("commit", end))
             duration = end - begin
-            if count == 0:
-                delay = max(0, 0.1 - duration)
-                await asyncio.sleep(delay)
+            if metrics is not None:
+                metrics.inc("ddss_rows_read_total", len(rows), component="egg", table=Ideas.__tablename__)
+                metrics.inc("ddss_rows_read_total", len(facts), component="egg", table=Facts.__tablename__)
+                for table, value in written.items():
+                    metrics.inc("ddss_rows_written_total", value, component="egg", table=table)
+                    metrics.inc("ddss_rows_inserted_total", added[table], component="egg", table=table)
+                metrics.inc("ddss_duplicates_total", cache.hits - hits, component="egg")
+                metrics.set("ddss_egraph_terms", len(search.terms))
+                metrics.set("ddss_egraph_eclasses", len(search.egraph.core.classes))
+                metrics.set("ddss_egg_pool", len(pool))
+                metrics.phases("egg", stamps)
+            if tracer is not None:
+                tracer.phases(
+                    "egg",
+                    stamps,
+                    fetch_ideas={"rows": len(rows)},
+                    fetch_facts={"rows": len(facts)},
+                    execute={"count": count, "pending": len(pool)},
+                    insert={"rows": inserted},
+                )
+            if profiler is not None:
+                profiler.iteration("egg")
+            # 只有实际插入的行才算进展, 重复产生的事实不算
+            if monitor is not None:
+                monitor.report("egg", begin, inserted)
+            await scheduler.pause("egg", session, duration, inserted, len(rows) + len(facts), inserted)
     except asyncio.CancelledError:
         pass
     finally:
+        if lease is not None:
+            async with session() as sess:
+                await lease.release(sess)
+                await sess.commit()
+        if cache.capacity:
+            print(cache.report("egg"))
+        if limits:
+            print(limits.report("egg"))
         await engine.dispose()
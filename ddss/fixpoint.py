@@ -0,0 +1,40 @@
+import asyncio
+
+
+class Monitor:
+    def __init__(self, names: list[str]) -> None:
+        self.begin: float = asyncio.get_running_loop().time()
+        self.last_change: float = self.begin
+        self.rounds: dict[str, int] = {name: 0 for name in names}
+        self.busy_rounds: dict[str, int] = {name: 0 for name in names}
+        self.idle_since: dict[str, float | None] = {name: None for name in names}
+        self.done: asyncio.Event = asyncio.Event()
+        self.end: float | None = None
+        self._check()
+
+    def report(self, name: str, begin: float, count: int) -> None:
+        self.rounds[name] += 1
+        if count != 0:
+            self.busy_rounds[name] += 1
+            self.last_change = asyncio.get_running_loop().time()
+            self.idle_since[name] = None
+        else:
+            self.idle_since[name] = begin
+        self._check()
+
+    def _check(self) -> None:
+        # 每个组件都在最后一次变化之后完整地空转了一轮, 即达到不动点
+        if self.done.is_set():
+            return
+        if all(since is not None and since >= self.last_change for since in self.idle_since.values()):
+            self.end = asyncio.get_running_loop().time()
+            self.done.set()
+
+    async def wait(self) -> float:
+        await self.done.wait()
+        return self.end - self.begin
+
+    def summary(self) -> str:
+        rounds = ", ".join(f"{name}: {self.busy_rounds[name]}/{self.rounds[name]} busy rounds" for name in self.rounds)
+        elapsed = (self.end if self.end is not None else asyncio.get_running_loop().time()) - self.begin
+        return f"fixpoint: {elapsed:.3f}s" + (f", {rounds}" if rounds else "")
@@ -0,0 +1,88 @@
+import os
+import sys
+import signal
+import asyncio
+import pathlib
+import tracemalloc
+import typing
+
+
+def peak_rss() -> int:
+    # resource 模块只在 Unix 上存在, 其他平台上峰值内存报告为 0
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Linux 以 KiB 为单位, macOS 以字节为单位
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class HeapReport:
+    def __init__(self, directory: str = ".", threshold: int | None = None, top: int = 20, frames: int = 1) -> None:
+        self.directory: pathlib.Path = pathlib.Path(directory)
+        self.threshold: int | None = threshold
+        self.top: int = top
+        self.frames: int = frames
+        self.sources: dict[str, typing.Callable[[], dict[str, int]]] = {}
+        self.previous: tracemalloc.Snapshot | None = None
+        self.snapshots: int = 0
+
+    def register(self, name: str, sizes: typing.Callable[[], dict[str, int]]) -> None:
+        self.sources[name] = sizes
+
+    def report(self) -> str:
+        lines = []
+        for name, sizes in self.sources.items():
+            lines.append(f"heap: {name} " + ", ".join(f"{key} {value}" for key, value in sizes().items()))
+        line = f"heap: peak rss {peak_rss() / 1048576:.1f} MiB"
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            line += f", traced {current / 1048576:.1f} MiB (peak {peak / 1048576:.1f} MiB)"
+        lines.append(line)
+        return "\n".join(lines)
+
+    def snapshot(self) -> pathlib.Path | None:
+        # 第一次快照只开始追踪并作为基线, 之后的快照记录相对上一次快照的增长
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ]
+        )
+        previous, self.previous = self.previous, snapshot
+        if previous is None:
+            print("heap: tracing started")
+            return None
+        self.snapshots += 1
+        path = self.directory / f"heap-{os.getpid()}-{self.snapshots}.txt"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stats = snapshot.compare_to(previous, "lineno")[: self.top]
+        path.write_text(self.report() + "\n" + "".join(f"{stat}\n" for stat in stats))
+        print(f"heap: snapshot {path}")
+        return path
+
+    async def run(self, interval: float = 60.0) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, self.snapshot)
+        except (AttributeError, NotImplementedError):
+            # Windows 上没有 SIGUSR1
+            pass
+        limit = self.threshold
+        if limit is not None:
+            self.snapshot()
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                print(self.report())
+                # 追踪的内存每增长一个阈值, 记录一次快照
+                if limit is not None and tracemalloc.get_traced_memory()[0] > limit:
+                    self.snapshot()
+                    limit = tracemalloc.get_traced_memory()[0] + self.threshold
+        finally:
+            if hasattr(signal, "SIGUSR1"):
+                loop.remove_signal_handler(signal.SIGUSR1)
+            tracemalloc.stop()
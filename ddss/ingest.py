@@ -0,0 +1,64 @@
+import asyncio
+from .orm import initialize_database, insert_or_ignore_many, Facts, Ideas
+from .utility import str_rule_get_str_idea, parse_lines
+
+
+async def main(addr, engine=None, session=None, host="127.0.0.1", port=7730, window=0.05, size=1000):
+    if engine is None or session is None:
+        engine, session = await initialize_database(addr)
+
+    queue: asyncio.Queue[list[str]] = asyncio.Queue(maxsize=size)
+
+    async def handle(reader, writer):
+        pending = b""
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if chunk:
+                    *lines, pending = (pending + chunk).split(b"\n")
+                else:
+                    lines, pending = [pending], b""
+                rules, errors = await asyncio.to_thread(parse_lines, [line.decode(errors="replace") for line in lines])
+                for error in errors:
+                    writer.write(f"{error}\n".encode())
+                await writer.drain()
+                if rules:
+                    await queue.put(rules)
+                if not chunk:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def flush(batch):
+        facts = list(batch)
+        ideas = [idea for ds in facts if (idea := str_rule_get_str_idea(ds))]
+        async with session() as sess:
+            await insert_or_ignore_many(sess, Facts, facts)
+            await insert_or_ignore_many(sess, Ideas, ideas)
+            await sess.commit()
+
+    batch = {}
+    try:
+        server = await asyncio.start_server(handle, host, port)
+        print(f"ingest: {host}:{port}")
+        async with server:
+            loop = asyncio.get_running_loop()
+            while True:
+                batch.update(dict.fromkeys(await queue.get()))
+                deadline = loop.time() + window
+                while len(batch) < size and (timeout := deadline - loop.time()) > 0:
+                    try:
+                        batch.update(dict.fromkeys(await asyncio.wait_for(queue.get(), timeout)))
+                    except TimeoutError:
+                        break
+                await flush(batch)
+                batch.clear()
+    except asyncio.CancelledError:
+        while not queue.empty():
+            batch.update(dict.fromkeys(queue.get_nowait()))
+        if batch:
+            await flush(batch)
+    finally:
+        await engine.dispose()
@@ -1,12 +1,21 @@
 import asyncio
+import pathlib
 from prompt_toolkit import PromptSession
 from prompt_toolkit.patch_stdout import patch_stdout
-from apyds_bnf import parse
-from .orm import initialize_database, insert_or_ignore, Facts, Ideas
-from .utility import str_rule_get_str_idea
+from .orm import initialize_database, insert_or_ignore_many, Facts, Ideas
+from .utility import str_rule_get_str_idea, parse_lines
+from .metrics import Metrics
+from .schedule import Scheduler
 
 
-async def main(addr, engine=None, session=None):
+def read_lines(line: str) -> list[str]:
+    if line.strip().startswith(":load "):
+        path = pathlib.Path(line.strip().removeprefix(":load ").strip()).expanduser()
+        return path.read_text().splitlines()
+    return line.splitlines()
+
+
+async def main(addr, engine=None, session=None, metrics: Metrics | None = None, scheduler: Scheduler | None = None):
     if engine is None or session is None:
         engine, session = await initialize_database(addr)
 
@@ -19,23 +28,35 @@ async def main(addr, engine=None, session=None):
             except (EOFError, KeyboardInterrupt):
                 raise asyncio.CancelledError()
 
-            data = line.strip()
-            if data == "":
-                continue
-            if data.startswith("//"):
-                continue
-
             try:
-                ds = parse(data)
-            except Exception as e:
+                lines = await asyncio.to_thread(read_lines, line)
+            except (OSError, ValueError) as e:
+                # 文件不存在或者不是 UTF-8 编码时, 只报告错误并继续读取输入
                 print(f"error: {e}")
                 continue
 
-            async with session() as sess:
-                await insert_or_ignore(sess, Facts, ds)
-                if idea := str_rule_get_str_idea(ds):
-                    await insert_or_ignore(sess, Ideas, idea)
-                await sess.commit()
+            rules, errors = await asyncio.to_thread(parse_lines, lines)
+            for error in errors:
+                print(error)
+
+            if rules:
+                begin = asyncio.get_running_loop().time()
+                ideas = [idea for ds in rules if (idea := str_rule_get_str_idea(ds))]
+                async with session() as sess:
+                    new_facts = await insert_or_ignore_many(sess, Facts, rules)
+                    new_ideas = await insert_or_ignore_many(sess, Ideas, ideas)
+                    await sess.commit()
+                if scheduler is not None and new_facts + new_ideas != 0:
+                    # 新的输入立即唤醒同一进程中的引擎和输出组件
+                    scheduler.notify("input", asyncio.get_running_loop().time() - begin)
+                if metrics is not None:
+                    metrics.inc("ddss_rows_written_total", len(rules), component="input", table=Facts.__tablename__)
+                    metrics.inc("ddss_rows_written_total", len(ideas), component="input", table=Ideas.__tablename__)
+                    metrics.inc("ddss_rows_inserted_total", new_facts, component="input", table=Facts.__tablename__)
+                    metrics.inc("ddss_rows_inserted_total", new_ideas, component="input", table=Ideas.__tablename__)
+
+            if len(lines) > 1:
+                print(f"batch: {len(rules)} rules, {len(errors)} errors")
     except asyncio.CancelledError:
         pass
     finally:
@@ -0,0 +1,64 @@
+import time
+import uuid
+import zlib
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from .orm import Workers
+
+
+class Lease:
+    def __init__(self, role: str, name: str | None = None, ttl: float = 10.0, partitions: int = 64) -> None:
+        self.role: str = role
+        self.name: str = f"{role}-{name if name is not None else uuid.uuid4().hex[:12]}"
+        self.ttl: float = ttl
+        self.partitions: int = partitions
+        self.members: list[str] = []
+        self.owned: set[int] = set()
+        # 最近一次心跳新获得和失去的分区
+        self.gained: set[int] = set()
+        self.lost: set[int] = set()
+        self.renewed: float = 0.0
+
+    def partition(self, data: str) -> int:
+        return zlib.crc32(data.encode()) % self.partitions
+
+    def owns(self, data: str) -> bool:
+        return self.partition(data) in self.owned
+
+    async def heartbeat(self, sess: AsyncSession) -> bool:
+        now = time.time()
+        if now - self.renewed < self.ttl / 3:
+            return False
+        self.renewed = now
+
+        result = await sess.execute(update(Workers).where(Workers.name == self.name).values(heartbeat=now))
+        if result.rowcount == 0:
+            sess.add(Workers(role=self.role, name=self.name, heartbeat=now))
+        # 移除心跳超时的成员, 它们的分区会分配给存活的成员
+        await sess.execute(delete(Workers).where(Workers.role == self.role, Workers.heartbeat < now - self.ttl))
+        members = list(await sess.scalars(select(Workers.name).where(Workers.role == self.role).order_by(Workers.name)))
+
+        # 所有成员按名称排序后轮流分配分区, 因此每个成员计算出的分配方案相同
+        index = members.index(self.name)
+        owned = {partition for partition in range(self.partitions) if partition % len(members) == index}
+        changed = owned != self.owned
+        self.gained = owned - self.owned
+        self.lost = self.owned - owned
+        self.members = members
+        self.owned = owned
+        return changed
+
+    async def renew(self, session) -> bool:
+        # 心跳使用独立的短事务并立即提交, 以免在引擎一轮的长事务中持有写锁, 或者被其他成员误认为超时
+        async with session() as sess:
+            changed = await self.heartbeat(sess)
+            await sess.commit()
+        return changed
+
+    async def release(self, sess: AsyncSession) -> None:
+        await sess.execute(delete(Workers).where(Workers.name == self.name))
+        self.members = []
+        self.owned = set()
+        self.gained = set()
+        self.lost = set()
+        self.renewed = 0.0
@@ -0,0 +1,37 @@
+from .utility import str_rule_get_shape
+
+
+class Limits:
+    def __init__(
+        self,
+        depth: int | None = None,
+        size: int | None = None,
+        variables: int | None = None,
+        buffer: int | None = None,
+    ) -> None:
+        self.depth: int | None = depth
+        self.size: int | None = size
+        self.variables: int | None = variables
+        # apyds 的搜索引擎会在内部继续使用推导出的规则, 只有其缓冲区大小 (字节) 能够限制内部的规模
+        self.buffer: int | None = buffer
+        self.rejected: dict[str, int] = {"depth": 0, "size": 0, "variables": 0}
+
+    def __bool__(self) -> bool:
+        return self.depth is not None or self.size is not None or self.variables is not None
+
+    def check(self, data: str) -> str | None:
+        depth, size, variables = str_rule_get_shape(data)
+        if self.depth is not None and depth > self.depth:
+            reason = "depth"
+        elif self.size is not None and size > self.size:
+            reason = "size"
+        elif self.variables is not None and variables > self.variables:
+            reason = "variables"
+        else:
+            return None
+        self.rejected[reason] += 1
+        return reason
+
+    def report(self, name: str) -> str:
+        rejected = ", ".join(f"{reason} {count}" for reason, count in self.rejected.items())
+        return f"{name}: rejected {sum(self.rejected.values())} ({rejected})"
@@ -2,9 +2,10 @@ import sys
 from apyds_bnf import parse
 from .orm import initialize_database, insert_or_ignore, Facts, Ideas
 from .utility import str_rule_get_str_idea
+from .metrics import Metrics
 
 
-async def main(addr, engine=None, session=None):
+async def main(addr, engine=None, session=None, metrics: Metrics | None = None):
     if engine is None or session is None:
         engine, session = await initialize_database(addr)
 
@@ -23,9 +24,15 @@ async def main(addr, engine=None, session=None):
                     print(f"error: {e}")
                     continue
 
-                await insert_or_ignore(sess, Facts, ds)
+                inserted = await insert_or_ignore(sess, Facts, ds)
+                if metrics is not None:
+                    metrics.inc("ddss_rows_written_total", component="load", table=Facts.__tablename__)
+                    metrics.inc("ddss_rows_inserted_total", inserted, component="load", table=Facts.__tablename__)
                 if idea := str_rule_get_str_idea(ds):
-                    await insert_or_ignore(sess, Ideas, idea)
+                    inserted = await insert_or_ignore(sess, Ideas, idea)
+                    if metrics is not None:
+                        metrics.inc("ddss_rows_written_total", component="load", table=Ideas.__tablename__)
+                        metrics.inc("ddss_rows_inserted_total", inserted, component="load", table=Ideas.__tablename__)
             await sess.commit()
     finally:
         await engine.dispose()
@@ -1,46 +1,203 @@
+import sys
 import asyncio
+import importlib
 import tempfile
 import pathlib
-from typing import Annotated, Optional
+import os
+from typing import Annotated, Any, Literal, Optional
 import tyro
-from .orm import initialize_database
-from .ds import main as ds
-from .egg import main as egg
-from .input import main as input
-from .output import main as output
-from .load import main as load
-from .dump import main as dump
+from .orm import initialize_database, dispose_replicas, count_rows, sqlite_memory_addr, Facts, Ideas
+from .fixpoint import Monitor
+from .lease import Lease
+from .limit import Limits
+from .metrics import Metrics
+from .profiling import Profiler
+from .trace import Tracer
+from .heap import HeapReport
+from .schedule import Scheduler
 
 component_map = {
-    "ds": ds,
-    "egg": egg,
-    "input": input,
-    "output": output,
-    "load": load,
-    "dump": dump,
+    "ds": ".ds",
+    "egg": ".egg",
+    "input": ".input",
+    "output": ".output",
+    "load": ".load",
+    "dump": ".dump",
+    "ingest": ".ingest",
+    "query": ".query",
+    "replay": ".replay",
 }
 
 
-async def run(addr: str, components: list[str]) -> None:
-    engine, session = await initialize_database(addr)
+def load_component(name: str):
+    # 组件模块只在被选中时才导入, 以免一次性的调用也加载 prompt_toolkit, apyds_egg 等依赖
+    return importlib.import_module(component_map[name], __package__).main
+
+
+# 批处理模式下, 先运行导入组件, 之后运行循环组件直到不动点, 最后运行导出组件
+saturate_before = {"load"}
+saturate_after = {"dump"}
+saturate_monitored = {"ds", "egg", "output"}
+
+metrics_components = {"ds", "egg", "input", "output", "load"}
+
+profiled_components = {"ds", "egg"}
+
+traced_components = {"ds", "egg"}
+
+heap_components = {"ds", "egg"}
+
+scheduled_components = {"ds", "egg", "input", "output"}
+
+
+async def run(
+    addr: str,
+    components: list[str],
+    options: Optional[dict[str, dict[str, Any]]] = None,
+    database: Optional[dict[str, Any]] = None,
+    saturate: bool = False,
+    shared_terms: bool = False,
+    metrics: Optional[Metrics] = None,
+    metrics_addr: Optional[str] = None,
+    metrics_file: Optional[str] = None,
+    metrics_interval: float = 10.0,
+    profiler: Optional[Profiler] = None,
+    profile_interval: Optional[float] = None,
+    tracer: Optional[Tracer] = None,
+    heap: Optional[HeapReport] = None,
+    heap_interval: float = 60.0,
+    record: Optional[str] = None,
+    scheduler: Optional[Scheduler] = None,
+) -> Optional[dict[str, float]]:
+    if options is None:
+        options = {}
+    if database is None:
+        database = {}
+    if scheduler is None:
+        scheduler = Scheduler()
+    engine, session = await initialize_database(addr, **database)
+    store = session
+    if shared_terms:
+        from .store import SharedStore
+
+        store = SharedStore(store)
+    if record is not None:
+        from .record import RecordingStore
+
+        store = RecordingStore(store, record)
+
+    def start(component, **kwargs):
+        if metrics is not None and component in metrics_components:
+            kwargs["metrics"] = metrics
+        if profiler is not None and component in profiler.profiles:
+            kwargs["profiler"] = profiler
+        if tracer is not None and component in traced_components:
+            kwargs["tracer"] = tracer
+        if heap is not None and component in heap_components:
+            kwargs["heap"] = heap
+        if component in scheduled_components:
+            kwargs["scheduler"] = scheduler
+        return load_component(component)(addr, engine, store, **options.get(component, {}), **kwargs)
+
+    services = []
+    server = None
+    if metrics is not None:
+        services.append(asyncio.create_task(metrics.watch(engine)))
+        if metrics_file is not None:
+            services.append(asyncio.create_task(metrics.dump(metrics_file, metrics_interval)))
+    if profiler is not None:
+        services.append(asyncio.create_task(profiler.run(profile_interval)))
+    if tracer is not None:
+        services.append(asyncio.create_task(tracer.run()))
+    if heap is not None:
+        services.append(asyncio.create_task(heap.run(heap_interval)))
 
     try:
-        try:
-            coroutines = [component_map[component](addr, engine, session) for component in components]
-        except KeyError as e:
-            print(f"error: unsupported component: {e}")
-            raise asyncio.CancelledError()
+        for component in components:
+            if component not in component_map:
+                print(f"error: unsupported component: '{component}'")
+                raise asyncio.CancelledError()
+
+        if metrics is not None and metrics_addr is not None:
+            # 端口被占用等绑定错误在启动时报告, 而不是在后台任务中被忽略
+            host, _, port = metrics_addr.rpartition(":")
+            try:
+                server = await metrics.serve(host, int(port))
+            except (OSError, ValueError) as e:
+                print(f"error: cannot serve metrics on '{metrics_addr}': {e}")
+                raise asyncio.CancelledError()
+
+        if saturate:
+            return await saturate_run(store, components, start)
 
         await asyncio.wait(
-            [asyncio.create_task(coro) for coro in coroutines],
+            [asyncio.create_task(start(component)) for component in components],
             return_when=asyncio.FIRST_COMPLETED,
         )
     except asyncio.CancelledError:
         pass
     finally:
+        for service in services:
+            service.cancel()
+        await asyncio.gather(*services, return_exceptions=True)
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        if record is not None:
+            store.close()
+        await dispose_replicas(session)
         await engine.dispose()
 
 
+async def saturate_run(session, components, start) -> Optional[dict[str, float]]:
+    loop = asyncio.get_running_loop()
+    begin = loop.time()
+    await asyncio.gather(*(start(component) for component in components if component in saturate_before))
+    loaded = loop.time()
+
+    monitor = Monitor([component for component in components if component in saturate_monitored])
+    tasks = {
+        asyncio.create_task(
+            start(component, monitor=monitor) if component in saturate_monitored else start(component)
+        ): component
+        for component in components
+        if component not in saturate_before and component not in saturate_after
+    }
+    done = asyncio.create_task(monitor.wait())
+    try:
+        # 组件在不动点之前退出或者出错时, 不能一直等待下去
+        finished, _ = await asyncio.wait([done, *tasks], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        done.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(done, *tasks, return_exceptions=True)
+    if done not in finished:
+        for task, component in tasks.items():
+            if task in finished:
+                error = task.exception()
+                reason = f"{type(error).__name__}: {error}" if error is not None else "returned"
+                print(f"error: component '{component}' stopped before the fixpoint: {reason}")
+        return None
+
+    await asyncio.gather(*(start(component) for component in components if component in saturate_after))
+
+    async with session() as sess:
+        facts = await count_rows(sess, Facts)
+        ideas = await count_rows(sess, Ideas)
+    end = loop.time()
+    print(f"load: {loaded - begin:.3f}s")
+    print(monitor.summary())
+    print(f"total: {end - begin:.3f}s, facts: {facts}, ideas: {ideas}")
+    return {
+        "load": loaded - begin,
+        "fixpoint": monitor.end - monitor.begin,
+        "total": end - begin,
+        "facts": facts,
+        "ideas": ideas,
+    }
+
+
 sqlalchemy_driver = {
     "sqlite": "aiosqlite",
     "mysql": "aiomysql",
@@ -49,6 +206,15 @@ sqlalchemy_driver = {
 }
 
 
+def normalize_addr(addr: str) -> Optional[str]:
+    for key, value in sqlalchemy_driver.items():
+        if addr.startswith(f"{key}://"):
+            addr = addr.replace(f"{key}://", f"{key}+{value}://")
+        if addr.startswith(f"{key}+{value}://"):
+            return addr
+    return None
+
+
 def main(
     addr: Annotated[
         Optional[str],
@@ -64,24 +230,337 @@ def main(
             help="Components to run.",
         ),
     ] = ["input", "output", "ds", "egg"],
+    ingest_addr: Annotated[
+        str,
+        tyro.conf.arg(
+            help="Listen address (HOST:PORT) of the ingest component.",
+        ),
+    ] = "127.0.0.1:7730",
+    cache_size: Annotated[
+        int,
+        tyro.conf.arg(
+            help="Number of recently written facts and ideas the ds and egg engines remember to skip duplicate inserts. 0 disables the cache.",
+        ),
+    ] = 65536,
+    sqlite_profile: Annotated[
+        Optional[Literal["default", "fast"]],
+        tyro.conf.arg(
+            help="SQLite tuning profile. 'fast' enables WAL, synchronous=NORMAL and larger mmap and page caches. WAL mode is stored in the database file, so 'fast' converts it permanently. If not provided, 'fast' is used for the temporary database and 'default' for --addr.",
+        ),
+    ] = None,
+    memory: Annotated[
+        bool,
+        tyro.conf.arg(
+            help="Use a throwaway in-memory SQLite database instead of a temporary file. Ignored if --addr is given.",
+        ),
+    ] = False,
+    partition: Annotated[
+        bool,
+        tyro.conf.arg(
+            help="Coordinate with other ds and egg workers on the same database and only process rules and ideas of the owned partitions.",
+        ),
+    ] = False,
+    worker_name: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            help="Name of this worker in the workers table. If not provided, a random name is used.",
+        ),
+    ] = None,
+    lease_ttl: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Seconds without heartbeat after which a worker is considered dead and its partitions are reassigned.",
+        ),
+    ] = 10.0,
+    read_addr: Annotated[
+        list[str],
+        tyro.conf.arg(
+            aliases=["-r"],
+            help="Database address URLs of read replicas. Polling reads are spread over them while inserts go to --addr.",
+        ),
+    ] = [],
+    staleness: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Seconds after a write of this process during which its reads stay on the primary database instead of the replicas. This only ensures reading its own writes, not writes of other processes.",
+        ),
+    ] = 1.0,
+    cursor: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            help="Name of a durable consumer cursor. output and dump resume after the last fact and idea emitted under this name.",
+        ),
+    ] = None,
+    saturate: Annotated[
+        bool,
+        tyro.conf.arg(
+            help="Batch mode: run load first, then the other components until no engine derives anything new for a full round, then dump, and exit with timing statistics.",
+        ),
+    ] = False,
+    query_timeout: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Seconds the query component waits for each goal before reporting a timeout.",
+        ),
+    ] = 1.0,
+    goal_directed: Annotated[
+        bool,
+        tyro.conf.arg(
+            help="Only let ds apply rules whose conclusion unifies with an open idea.",
+        ),
+    ] = False,
+    relevance_budget: Annotated[
+        int,
+        tyro.conf.arg(
+            help="Number of irrelevant rules a goal-directed ds still admits per round. 0 restricts inference to relevant rules.",
+        ),
+    ] = 0,
+    max_depth: Annotated[
+        Optional[int],
+        tyro.conf.arg(
+            help="Drop facts derived by ds and egg whose terms are nested deeper than this.",
+        ),
+    ] = None,
+    max_size: Annotated[
+        Optional[int],
+        tyro.conf.arg(
+            help="Drop facts derived by ds and egg with more atoms and lists than this.",
+        ),
+    ] = None,
+    max_variables: Annotated[
+        Optional[int],
+        tyro.conf.arg(
+            help="Drop facts derived by ds and egg with more distinct variables than this.",
+        ),
+    ] = None,
+    max_bytes: Annotated[
+        Optional[int],
+        tyro.conf.arg(
+            help="Encoded size in bytes above which ds's search engine stops using derived rules internally.",
+        ),
+    ] = None,
+    quarantine: Annotated[
+        bool,
+        tyro.conf.arg(
+            help="Store facts dropped by the size limits in the quarantine table instead of discarding them.",
+        ),
+    ] = False,
+    shared_terms: Annotated[
+        bool,
+        tyro.conf.arg(
+            help="Store facts and ideas as references into a table of shared subterms instead of as full text.",
+        ),
+    ] = False,
+    metrics_addr: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            help="Serve Prometheus metrics of the components at http://HOST:PORT/metrics.",
+        ),
+    ] = None,
+    metrics_file: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            help="Periodically write Prometheus metrics of the components to this file.",
+        ),
+    ] = None,
+    metrics_interval: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Seconds between two writes of --metrics-file.",
+        ),
+    ] = 10.0,
+    profile: Annotated[
+        list[str],
+        tyro.conf.arg(
+            help="Components (ds, egg) whose loop iterations are profiled with cProfile. Stats are written to --profile-dir as COMPONENT.pstats.",
+        ),
+    ] = [],
+    profile_dir: Annotated[
+        str,
+        tyro.conf.arg(
+            help="Directory the profiles are written to.",
+        ),
+    ] = ".",
+    profile_interval: Annotated[
+        Optional[float],
+        tyro.conf.arg(
+            help="Seconds between two writes of the profiles. If not provided, they are written at exit only.",
+        ),
+    ] = None,
+    profile_iterations: Annotated[
+        Optional[int],
+        tyro.conf.arg(
+            help="Stop profiling a component after this many loop iterations. If not provided, the whole run is profiled.",
+        ),
+    ] = None,
+    trace: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            help="Write a Chrome trace (chrome://tracing, Perfetto) with a span per phase of each ds and egg iteration to this file.",
+        ),
+    ] = None,
+    heap_interval: Annotated[
+        Optional[float],
+        tyro.conf.arg(
+            help="Print the sizes of the ds and egg in-memory structures and the peak RSS every this many seconds. SIGUSR1 takes a tracemalloc snapshot and writes the top allocation growth since the previous one.",
+        ),
+    ] = None,
+    heap_threshold: Annotated[
+        Optional[int],
+        tyro.conf.arg(
+            help="Trace allocations from the start and take a snapshot each time traced memory grows by this many bytes. Growth is checked with each heap report, every 60 seconds unless --heap-interval is given.",
+        ),
+    ] = None,
+    heap_dir: Annotated[
+        str,
+        tyro.conf.arg(
+            help="Directory the heap snapshots are written to.",
+        ),
+    ] = ".",
+    record: Annotated[
+        Optional[str],
+        tyro.conf.arg(
+            help="Record the timestamped reads, inserts and commits of all components to this gzip file, for replaying with the replay component.",
+        ),
+    ] = None,
+    replay_file: Annotated[
+        str,
+        tyro.conf.arg(
+            help="Recording replayed by the replay component.",
+        ),
+    ] = "ddss.rec",
+    replay_speed: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Speed-up of the replay component relative to the recording. 0 replays as fast as possible.",
+        ),
+    ] = 1.0,
+    poll_interval: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Seconds ds, egg and output wait after their first idle round before polling the database again.",
+        ),
+    ] = 0.1,
+    max_poll_interval: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Upper bound of the polling interval of idle components, and so of the delay before they notice writes from other processes. New data written by a component in the same process wakes the others at once.",
+        ),
+    ] = 0.5,
+    backoff: Annotated[
+        float,
+        tyro.conf.arg(
+            help="Factor by which the polling interval grows with each consecutive idle round.",
+        ),
+    ] = 2.0,
+    queue_depth: Annotated[
+        int,
+        tyro.conf.arg(
+            help="Rows read in one round at which a busy component stops yielding to higher-priority components. 0 always yields.",
+        ),
+    ] = 100,
+    priority: Annotated[
+        list[str],
+        tyro.conf.arg(
+            help="Priorities of components as NAME=VALUE, such as ds=2. Defaults are input=4, output=2, ds=1 and egg=1. Busy components yield the event loop to recently busy components of higher priority in proportion to the priorities.",
+        ),
+    ] = [],
 ) -> None:
     """DDSS - Distributed Deductive System Sorts: Run DDSS with an interactive deductive environment."""
+    if sqlite_profile is None:
+        # 只有自行创建的临时数据库默认使用 WAL 模式, 用户的数据库文件保持原样
+        sqlite_profile = "fast" if addr is None else "default"
+    if addr is None and memory:
+        addr = sqlite_memory_addr(f"ddss-{os.getpid()}")
     if addr is None:
         tmpdir = tempfile.TemporaryDirectory(prefix="ddss-")
         path = pathlib.Path(tmpdir.name) / "ddss.db"
         addr = f"sqlite:///{path.as_posix()}"
     print(f"addr: {addr}")
 
-    for key, value in sqlalchemy_driver.items():
-        if addr.startswith(f"{key}://"):
-            addr = addr.replace(f"{key}://", f"{key}+{value}://")
-        if addr.startswith(f"{key}+{value}://"):
-            break
-    else:
-        print(f"error: unsupported database: '{addr}'")
-        return
+    replicas = []
+    for database_addr in [addr, *read_addr]:
+        if (normalized := normalize_addr(database_addr)) is None:
+            print(f"error: unsupported database: '{database_addr}'")
+            return
+        replicas.append(normalized)
+    addr = replicas.pop(0)
+
+    host, _, port = ingest_addr.rpartition(":")
+    options = {
+        "ingest": {"host": host, "port": int(port)},
+        "output": {"cursor": cursor},
+        "dump": {"cursor": cursor},
+        "query": {"timeout": query_timeout},
+        "replay": {"path": replay_file, "speed": replay_speed},
+        "ds": {
+            "cache_size": cache_size,
+            "lease": Lease("ds", worker_name, lease_ttl) if partition else None,
+            "goal_directed": goal_directed,
+            "budget": relevance_budget,
+            "limits": Limits(max_depth, max_size, max_variables, max_bytes),
+            "quarantine": quarantine,
+        },
+        "egg": {
+            "cache_size": cache_size,
+            "lease": Lease("egg", worker_name, lease_ttl) if partition else None,
+            "limits": Limits(max_depth, max_size, max_variables),
+            "quarantine": quarantine,
+        },
+    }
+
+    database = {
+        "sqlite_profile": sqlite_profile,
+        "replicas": replicas,
+        "staleness": staleness,
+    }
+
+    metrics = Metrics() if metrics_addr is not None or metrics_file is not None else None
 
-    asyncio.run(run(addr, component))
+    for name in profile:
+        if name not in profiled_components:
+            print(f"error: unsupported profiled component: '{name}'")
+            return
+    profiler = Profiler(profile, profile_dir, profile_iterations) if profile else None
+
+    priorities = {}
+    for item in priority:
+        name, _, value = item.partition("=")
+        try:
+            priorities[name] = float(value)
+        except ValueError:
+            priorities[name] = 0.0
+        if name not in scheduled_components or priorities[name] <= 0:
+            print(f"error: unsupported priority: '{item}'")
+            return
+    scheduler = Scheduler(poll_interval, max_poll_interval, backoff, queue_depth, priorities)
+
+    stats = asyncio.run(
+        run(
+            addr,
+            component,
+            options,
+            database,
+            saturate,
+            shared_terms,
+            metrics=metrics,
+            metrics_addr=metrics_addr,
+            metrics_file=metrics_file,
+            metrics_interval=metrics_interval,
+            profiler=profiler,
+            profile_interval=profile_interval,
+            tracer=Tracer(trace) if trace is not None else None,
+            heap=HeapReport(heap_dir, heap_threshold)
+            if heap_interval is not None or heap_threshold is not None
+            else None,
+            heap_interval=heap_interval if heap_interval is not None else 60.0,
+            record=record,
+            scheduler=scheduler,
+        )
+    )
+    if saturate and stats is None:
+        # 批处理没有到达不动点时以非零状态退出, 以便调度系统发现失败
+        sys.exit(1)
 
 
 def cli():
@@ -0,0 +1,122 @@
+import asyncio
+import bisect
+import pathlib
+from collections import defaultdict
+
+Labels = tuple[tuple[str, str], ...]
+
+descriptions: dict[str, str] = {
+    "ddss_rows_read_total": "Rows read from the database.",
+    "ddss_rows_written_total": "Rows submitted for insertion.",
+    "ddss_rows_inserted_total": "Rows actually inserted; submitted rows that already existed are not counted.",
+    "ddss_duplicates_total": "Inserts skipped because the row was written or read recently.",
+    "ddss_loop_seconds": "Duration of each phase of an engine loop.",
+    "ddss_egraph_terms": "Terms known to the egg engine.",
+    "ddss_egraph_eclasses": "E-classes in the egg engine's e-graph.",
+    "ddss_egg_pool": "Ideas the egg engine is still trying to prove.",
+    "ddss_pool_connections": "Database connections currently checked out of the pool.",
+    "ddss_event_loop_lag_seconds": "Delay of the event loop in waking a periodic timer.",
+}
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    items = [*labels, *extra]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+class Metrics:
+    def __init__(self, buckets: tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)) -> None:
+        self.buckets: tuple[float, ...] = buckets
+        self.counters: dict[str, dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self.gauges: dict[str, dict[Labels, float]] = defaultdict(dict)
+        # 每个直方图记录各个桶 (含 +Inf) 的计数, 以及总和与总数
+        self.histograms: dict[str, dict[Labels, list[float]]] = defaultdict(dict)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        self.counters[name][tuple(labels.items())] += value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        self.gauges[name][tuple(labels.items())] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(labels.items())
+        if (histogram := self.histograms[name].get(key)) is None:
+            histogram = self.histograms[name][key] = [0.0] * (len(self.buckets) + 3)
+        histogram[bisect.bisect_left(self.buckets, value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def phases(self, component: str, stamps: list[tuple[str, float]]) -> None:
+        for (_, begin), (phase, end) in zip(stamps, stamps[1:]):
+            self.observe("ddss_loop_seconds", end - begin, component=component, phase=phase)
+
+    def render(self) -> str:
+        lines = []
+        for kind, families in (("counter", self.counters), ("gauge", self.gauges), ("histogram", self.histograms)):
+            for name, series in sorted(families.items()):
+                lines.append(f"# HELP {name} {descriptions.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series.items():
+                    if kind != "histogram":
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+                        continue
+                    cumulative = 0.0
+                    for bound, count in zip([*self.buckets, "+Inf"], value):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, (('le', str(bound)),))} {cumulative:g}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value[-2]:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {value[-1]:g}")
+        return "".join(f"{line}\n" for line in lines)
+
+    async def watch(self, engine=None, interval: float = 1.0) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            begin = loop.time()
+            await asyncio.sleep(interval)
+            self.observe("ddss_event_loop_lag_seconds", max(0.0, loop.time() - begin - interval))
+            # 内存存储和部分连接池没有连接计数
+            if (checkedout := getattr(getattr(engine, "pool", None), "checkedout", None)) is not None:
+                self.set("ddss_pool_connections", checkedout())
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9730) -> asyncio.Server:
+        # 绑定失败时直接抛出 OSError, 由调用者在启动时报告
+        async def handle(reader, writer):
+            try:
+                request = await reader.readline()
+                while (await reader.readline()).strip():
+                    pass
+                if request.split(b" ")[1:2] == [b"/metrics"]:
+                    status, body = "200 OK", self.render().encode()
+                else:
+                    status, body = "404 Not Found", b"not found\n"
+                header = f"HTTP/1.0 {status}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {len(body)}\r\n\r\n"
+                writer.write(header.encode() + body)
+                await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        print(f"metrics: http://{host}:{port}/metrics")
+        return server
+
+    async def dump(self, path: str, interval: float = 10.0) -> None:
+        target = pathlib.Path(path)
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await asyncio.to_thread(self._write, target, self.render())
+        finally:
+            self._write(target, self.render())
+
+    def _write(self, target: pathlib.Path, text: str) -> None:
+        # 先写入临时文件再替换, 以免读取者看到写了一半的文件. 写入失败时只报告错误, 下一次继续尝试
+        temporary = target.with_name(f"{target.name}.tmp")
+        try:
+            temporary.write_text(text)
+            temporary.replace(target)
+        except OSError as e:
+            print(f"error: cannot write metrics to '{target}': {e}")
@@ -1,13 +1,13 @@
+import time
 import asyncio
-from collections import defaultdict
+import random
+import typing
+import sqlite3
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import Integer, Text
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy.dialects.sqlite import insert as sqlite_insert
-from sqlalchemy.dialects.mysql import insert as mysql_insert
-from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy import Integer, Float, String, Text, Select, select, insert, update, event, func
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
 
 
 class Base(DeclarativeBase):
@@ -26,30 +26,286 @@ class Ideas(Base):
     data: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
 
 
-async def initialize_database(addr: str) -> tuple[AsyncEngine, async_sessionmaker[AsyncSession]]:
+class Quarantine(Base):
+    __tablename__ = "quarantine"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    data: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
+
+
+class Terms(Base):
+    __tablename__ = "terms"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    data: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
+
+
+class SharedFacts(Base):
+    __tablename__ = "shared_facts"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    data: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
+
+
+class SharedIdeas(Base):
+    __tablename__ = "shared_ideas"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    data: Mapped[str] = mapped_column(Text, unique=True, nullable=False)
+
+
+class Workers(Base):
+    __tablename__ = "workers"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    role: Mapped[str] = mapped_column(String(64), nullable=False)
+    name: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+    heartbeat: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class Cursors(Base):
+    __tablename__ = "cursors"
+    name: Mapped[str] = mapped_column(String(255), primary_key=True)
+    fact: Mapped[int] = mapped_column(Integer, nullable=False)
+    idea: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+sqlite_profiles: dict[str, dict[str, str | int]] = {
+    "default": {},
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+# 内存数据库在最后一个连接关闭时被销毁, 因此为每个内存数据库保留一个连接
+_memory_anchors: dict[str, sqlite3.Connection] = {}
+
+
+def sqlite_memory_addr(name: str) -> str:
+    return f"sqlite:///file:/{name}?vfs=memdb&uri=true"
+
+
+class Router:
+    def __init__(self, replicas: list[AsyncEngine], staleness: float) -> None:
+        self.replicas: list[AsyncEngine] = replicas
+        self.staleness: float = staleness
+        self.written: float = float("-inf")
+
+    def choose(self) -> AsyncEngine | None:
+        # 本进程写入后的一段时间内从主库读取, 避免读到落后于自身写入的副本
+        # 这只保证读到自身的写入, 不反映副本的实际延迟, 也不涵盖其他进程的写入
+        if not self.replicas or time.monotonic() - self.written < self.staleness:
+            return None
+        return random.choice(self.replicas)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, *, clause=None, **kw):
+        router: Router | None = self.info.get("router")
+        if router is not None:
+            # 标记为 primary 的查询必须读到最新的数据, 例如游标和插入前的存在性检查
+            if isinstance(clause, Select) and not self._flushing and not clause.get_execution_options().get("primary"):
+                if (replica := router.choose()) is not None:
+                    return replica.sync_engine
+            else:
+                router.written = time.monotonic()
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def _create_engine(addr: str, sqlite_profile: str) -> AsyncEngine:
     engine = create_async_engine(addr)
-    session = async_sessionmaker(engine)
+    if engine.dialect.name == "sqlite":
+        if engine.url.query.get("vfs") == "memdb" and engine.url.database not in _memory_anchors:
+            _memory_anchors[engine.url.database] = sqlite3.connect(
+                f"{engine.url.database}?vfs=memdb", uri=True, check_same_thread=False
+            )
+        pragmas = sqlite_profiles[sqlite_profile]
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for key, value in pragmas.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+            cursor.close()
+
+    return engine
+
+
+async def initialize_database(
+    addr: str,
+    sqlite_profile: str = "default",
+    replicas: typing.Sequence[str] = (),
+    staleness: float = 1.0,
+) -> tuple[AsyncEngine, async_sessionmaker[AsyncSession]]:
+    engine = _create_engine(addr, sqlite_profile)
+    if replicas:
+        router = Router([_create_engine(replica, sqlite_profile) for replica in replicas], staleness)
+        session = async_sessionmaker(engine, sync_session_class=RoutingSession, info={"router": router})
+    else:
+        session = async_sessionmaker(engine)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     return engine, session
 
 
-async def insert_or_ignore(sess: AsyncSession, model: type[Base], data: str, locks=defaultdict(asyncio.Lock)) -> None:
+async def dispose_replicas(session: async_sessionmaker[AsyncSession]) -> None:
+    if (router := session.kw.get("info", {}).get("router")) is not None:
+        for replica in router.replicas:
+            await replica.dispose()
+
+
+# 不使用 SQL 的存储 (内存存储, 共享子项存储, 录制存储) 实现以下接口, 本模块的函数对它们直接转发,
+# 对 SQL 会话则使用各方言的语句. 组件只通过这些函数访问事实, 想法, 隔离表和游标
+@typing.runtime_checkable
+class StoreSession(typing.Protocol):
+    async def fetch_after(self, model: type[Base], after: int) -> typing.Sequence[typing.Any]: ...
+
+    async def count_rows(self, model: type[Base]) -> int: ...
+
+    async def insert_or_ignore_many(self, model: type[Base], data: typing.Iterable[str]) -> int: ...
+
+    async def load_cursor(self, name: str) -> tuple[int, int]: ...
+
+    async def save_cursor(self, name: str, fact: int, idea: int) -> None: ...
+
+    async def commit(self) -> None: ...
+
+
+@typing.runtime_checkable
+class Store(typing.Protocol):
+    def __call__(self) -> StoreSession: ...
+
+    async def wait(self, timeout: float) -> None: ...
+
+
+async def load_cursor(sess: AsyncSession | StoreSession, name: str) -> tuple[int, int]:
+    if isinstance(sess, StoreSession):
+        return await sess.load_cursor(name)
+    cursor = await sess.scalar(select(Cursors).where(Cursors.name == name).execution_options(primary=True))
+    if cursor is None:
+        return -1, -1
+    return cursor.fact, cursor.idea
+
+
+async def save_cursor(sess: AsyncSession | StoreSession, name: str, fact: int, idea: int) -> None:
+    if isinstance(sess, StoreSession):
+        await sess.save_cursor(name, fact, idea)
+        return
+    values = {"name": name, "fact": fact, "idea": idea}
     match sess.bind.dialect.name:
         case "sqlite":
-            statement = sqlite_insert(model).values(data=data).on_conflict_do_nothing()
+            from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+            statement = sqlite_insert(Cursors).values(values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Cursors.name], set_={"fact": fact, "idea": idea}
+            )
             await sess.execute(statement)
         case "mysql" | "mariadb":
-            statement = mysql_insert(model).values(data=data).prefix_with("IGNORE")
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+            statement = mysql_insert(Cursors).values(values).on_duplicate_key_update(fact=fact, idea=idea)
             await sess.execute(statement)
         case "postgresql":
-            statement = postgresql_insert(model).values(data=data).on_conflict_do_nothing()
+            from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+            statement = postgresql_insert(Cursors).values(values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Cursors.name], set_={"fact": fact, "idea": idea}
+            )
             await sess.execute(statement)
         case _:
-            async with locks[id(sess.bind)]:
-                try:
-                    async with sess.begin_nested():
-                        sess.add(model(data=data))
-                        await sess.flush()
-                except IntegrityError:
-                    pass
+            statement = update(Cursors).where(Cursors.name == name).values(fact=fact, idea=idea)
+            if (await sess.execute(statement)).rowcount != 0:
+                return
+            try:
+                async with sess.begin_nested():
+                    await sess.execute(insert(Cursors).values(values))
+            except IntegrityError:
+                # 其他进程同时创建了同名的游标, 改为更新
+                await sess.execute(statement)
+
+
+async def wait_for_change(session: async_sessionmaker[AsyncSession] | Store, delay: float) -> None:
+    if isinstance(session, Store):
+        await session.wait(delay)
+        return
+    await asyncio.sleep(delay)
+
+
+async def fetch_after(sess: AsyncSession | StoreSession, model: type[Base], after: int) -> typing.Sequence[Base]:
+    if isinstance(sess, StoreSession):
+        return await sess.fetch_after(model, after)
+    return (await sess.scalars(select(model).where(model.id > after))).all()
+
+
+async def count_rows(sess: AsyncSession | StoreSession, model: type[Base]) -> int:
+    if isinstance(sess, StoreSession):
+        return await sess.count_rows(model)
+    return await sess.scalar(select(func.count()).select_from(model))
+
+
+async def insert_or_ignore(sess: AsyncSession | StoreSession, model: type[Base], data: str) -> int:
+    return await insert_or_ignore_many(sess, model, [data])
+
+
+async def insert_or_ignore_many(
+    sess: AsyncSession | StoreSession,
+    model: type[Base],
+    data: typing.Iterable[str],
+    chunk: int = 500,
+) -> int:
+    # 返回实际插入的行数, 已经存在的行不计入
+    if isinstance(sess, StoreSession):
+        return await sess.insert_or_ignore_many(model, data)
+    values = [{"data": item} for item in dict.fromkeys(data)]
+    inserted = 0
+    # 各方言的插入语句只在使用时导入, 未使用的方言不会被加载
+    for begin in range(0, len(values), chunk):
+        part = values[begin : begin + chunk]
+        match sess.bind.dialect.name:
+            case "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+                statement = sqlite_insert(model).values(part).on_conflict_do_nothing()
+                inserted += (await sess.execute(statement)).rowcount
+            case "mysql" | "mariadb":
+                from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+                statement = mysql_insert(model).values(part).prefix_with("IGNORE")
+                inserted += (await sess.execute(statement)).rowcount
+            case "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+                statement = postgresql_insert(model).values(part).on_conflict_do_nothing()
+                inserted += (await sess.execute(statement)).rowcount
+            case _:
+                # 回退路径先查询再使用保存点插入, 同一个会话上的并发调用必须串行执行
+                async with sess.info.setdefault("insert_lock", asyncio.Lock()):
+                    inserted += await _insert_missing(sess, model, [value["data"] for value in part])
+    return inserted
+
+
+async def _insert_missing(sess: AsyncSession, model: type[Base], data: list[str], retries: int = 3) -> int:
+    for _ in range(retries):
+        statement = select(model.data).where(model.data.in_(data)).execution_options(primary=True)
+        existing = set(await sess.scalars(statement))
+        missing = [item for item in data if item not in existing]
+        if not missing:
+            return 0
+        try:
+            async with sess.begin_nested():
+                await sess.execute(insert(model), [{"data": item} for item in missing])
+            return len(missing)
+        except IntegrityError:
+            # 其他写入者并发插入了部分数据, 重新查询后再试
+            data = missing
+    inserted = 0
+    for item in data:
+        try:
+            async with sess.begin_nested():
+                await sess.execute(insert(model), [{"data": item}])
+            inserted += 1
+        except IntegrityError:
+            pass
+    return inserted
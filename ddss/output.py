@@ -1,37 +1,60 @@
 import asyncio
-from sqlalchemy import select
 from apyds_bnf import unparse
-from .orm import initialize_database, Facts, Ideas
+from .orm import initialize_database, fetch_after, load_cursor, save_cursor, Facts, Ideas
+from .fixpoint import Monitor
+from .metrics import Metrics
+from .schedule import Scheduler
 
 
-async def main(addr, engine=None, session=None):
+async def main(
+    addr,
+    engine=None,
+    session=None,
+    cursor: str | None = None,
+    monitor: Monitor | None = None,
+    metrics: Metrics | None = None,
+    scheduler: Scheduler | None = None,
+):
     if engine is None or session is None:
         engine, session = await initialize_database(addr)
+    if scheduler is None:
+        scheduler = Scheduler()
 
     try:
         max_fact = -1
         max_idea = -1
+        if cursor is not None:
+            async with session() as sess:
+                max_fact, max_idea = await load_cursor(sess, cursor)
 
         while True:
             count = 0
             begin = asyncio.get_running_loop().time()
 
             async with session() as sess:
-                for i in await sess.scalars(select(Ideas).where(Ideas.id > max_idea)):
+                ideas = await fetch_after(sess, Ideas, max_idea)
+                for i in ideas:
                     max_idea = max(max_idea, i.id)
                     print("idea:", unparse(i.data))
                     count += 1
-                for i in await sess.scalars(select(Facts).where(Facts.id > max_fact)):
+                facts = await fetch_after(sess, Facts, max_fact)
+                for i in facts:
                     max_fact = max(max_fact, i.id)
                     print("fact:", unparse(i.data))
                     count += 1
+                if cursor is not None and count != 0:
+                    await save_cursor(sess, cursor, max_fact, max_idea)
                 await sess.commit()
 
             end = asyncio.get_running_loop().time()
             duration = end - begin
-            if count == 0:
-                delay = max(0, 0.1 - duration)
-                await asyncio.sleep(delay)
+            if metrics is not None:
+                metrics.inc("ddss_rows_read_total", len(ideas), component="output", table=Ideas.__tablename__)
+                metrics.inc("ddss_rows_read_total", len(facts), component="output", table=Facts.__tablename__)
+                metrics.phases("output", [("", begin), ("fetch", end)])
+            if monitor is not None:
+                monitor.report("output", begin, count)
+            await scheduler.pause("output", session, duration, count, count)
     except asyncio.CancelledError:
         pass
     finally:
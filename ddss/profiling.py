@@ -0,0 +1,57 @@
+import asyncio
+import cProfile
+import contextlib
+import pathlib
+import typing
+
+
+class Profiler:
+    def __init__(self, names: list[str], directory: str = ".", iterations: int | None = None) -> None:
+        self.directory: pathlib.Path = pathlib.Path(directory)
+        self.profiles: dict[str, cProfile.Profile] = {name: cProfile.Profile() for name in names}
+        self.remaining: dict[str, int | None] = {name: iterations for name in names}
+
+    @contextlib.contextmanager
+    def section(self, name: str) -> typing.Iterator[None]:
+        # 同一时刻只能有一个分析器处于启用状态, 因此只分析不含 await 的同步代码段
+        profile = self.profiles.get(name)
+        if profile is None or self.remaining[name] == 0:
+            yield
+            return
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def iteration(self, name: str) -> None:
+        remaining = self.remaining.get(name)
+        if remaining:
+            self.remaining[name] = remaining - 1
+            if remaining == 1:
+                self.write(name)
+
+    def write(self, name: str) -> pathlib.Path:
+        path = self.directory / f"{name}.pstats"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.profiles[name].dump_stats(path)
+        return path
+
+    async def run(self, interval: float | None = None) -> None:
+        try:
+            # 未指定间隔时只在退出时写入
+            if interval is None:
+                await asyncio.Event().wait()
+            while True:
+                await asyncio.sleep(interval)
+                for name in self.profiles:
+                    self.write(name)
+        finally:
+            for name in self.profiles:
+                print(f"profile: {self.write(name)}")
+
+
+def section(profiler: Profiler | None, name: str) -> typing.ContextManager[None]:
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.section(name)
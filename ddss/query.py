@@ -0,0 +1,72 @@
+import sys
+import asyncio
+from sqlalchemy import select
+from apyds import Rule
+from apyds_bnf import unparse
+from .orm import initialize_database, insert_or_ignore, fetch_after, StoreSession, Facts, Ideas
+from .utility import parse_lines, str_rule_get_str_idea
+
+
+async def query(session, goal: str, timeout: float = 1.0, interval: float = 0.01) -> tuple[str | None, float]:
+    loop = asyncio.get_running_loop()
+    begin = loop.time()
+    # 目标只能是事实, 含有前提的规则不能作为想法登记
+    if str_rule_get_str_idea(goal) is not None:
+        raise ValueError(f"goal has premises: {unparse(goal)}")
+
+    async with session() as sess:
+        await insert_or_ignore(sess, Ideas, goal)
+        await sess.commit()
+
+    # 不含变量的目标直接通过唯一索引查找, 含变量的目标需要增量扫描新的事实并尝试合一
+    pattern = Rule(goal).conclusion
+    max_fact = -1
+    while True:
+        async with session() as sess:
+            if "`" not in goal and not isinstance(sess, StoreSession):
+                if (answer := await sess.scalar(select(Facts.data).where(Facts.data == goal))) is not None:
+                    return answer, loop.time() - begin
+            else:
+                # 内存存储和共享存储没有按内容的索引, 同样通过增量扫描查找
+                for i in sorted(await fetch_after(sess, Facts, max_fact), key=lambda i: i.id):
+                    max_fact = max(max_fact, i.id)
+                    # 只有事实能回答目标, 含有前提的规则不必解析
+                    if i.data.startswith("--") and pattern @ Rule(i.data).conclusion:
+                        return i.data, loop.time() - begin
+
+        remaining = timeout - (loop.time() - begin)
+        if remaining <= 0:
+            return None, loop.time() - begin
+        await asyncio.sleep(min(interval, remaining))
+
+
+async def main(addr, engine=None, session=None, timeout=1.0):
+    if engine is None or session is None:
+        engine, session = await initialize_database(addr)
+
+    try:
+        rules, errors = parse_lines(sys.stdin)
+        for error in errors:
+            print(error)
+        goals = []
+        for goal in rules:
+            if str_rule_get_str_idea(goal) is not None:
+                print(f"error: goal has premises: {unparse(goal)}")
+                continue
+            goals.append(goal)
+
+        async def ask(goal):
+            answer, latency = await query(session, goal, timeout)
+            if answer is None:
+                print(f"timeout: {unparse(goal)} ({latency * 1000:.1f}ms)")
+            else:
+                print(f"answer: {unparse(answer)} ({latency * 1000:.1f}ms)")
+            return latency
+
+        latencies = sorted(await asyncio.gather(*(ask(goal) for goal in goals)))
+        if latencies:
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+            print(f"queries: {len(latencies)}, p50: {p50 * 1000:.1f}ms, p99: {p99 * 1000:.1f}ms")
+    finally:
+        await engine.dispose()
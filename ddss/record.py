@@ -0,0 +1,77 @@
+import gzip
+import json
+import asyncio
+import itertools
+import typing
+from .orm import fetch_after, count_rows, insert_or_ignore_many, load_cursor, save_cursor, wait_for_change, Base
+
+# 记录文件的每一行是一个 JSON 数组: [时间, 会话编号, 操作, 参数...]
+# 操作: o 打开会话, x 关闭会话, r 增量读取 (表, 游标), w 插入 (表, 数据), c 提交
+
+
+class RecordingSession:
+    def __init__(self, store: "RecordingStore", sess: typing.Any) -> None:
+        self.store: RecordingStore = store
+        self.sess: typing.Any = sess
+        self.id: int = next(store.ids)
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.sess, name)
+
+    async def __aenter__(self) -> "RecordingSession":
+        await self.sess.__aenter__()
+        self.store.write(self.id, "o")
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.store.write(self.id, "x")
+        await self.sess.__aexit__(*args)
+
+    async def fetch_after(self, model: type[Base], after: int) -> typing.Sequence[typing.Any]:
+        self.store.write(self.id, "r", model.__tablename__, after)
+        return await fetch_after(self.sess, model, after)
+
+    async def count_rows(self, model: type[Base]) -> int:
+        return await count_rows(self.sess, model)
+
+    async def load_cursor(self, name: str) -> tuple[int, int]:
+        return await load_cursor(self.sess, name)
+
+    async def save_cursor(self, name: str, fact: int, idea: int) -> None:
+        await save_cursor(self.sess, name, fact, idea)
+
+    async def insert_or_ignore_many(self, model: type[Base], data: typing.Iterable[str]) -> int:
+        data = list(data)
+        self.store.write(self.id, "w", model.__tablename__, data)
+        return await insert_or_ignore_many(self.sess, model, data)
+
+    async def commit(self) -> None:
+        self.store.write(self.id, "c")
+        await self.sess.commit()
+
+
+class RecordingStore:
+    def __init__(self, session: typing.Any, path: str) -> None:
+        self.session: typing.Any = session
+        self.file: typing.TextIO = gzip.open(path, "wt")
+        self.ids: typing.Iterator[int] = itertools.count()
+        self.begin: float = asyncio.get_running_loop().time()
+
+    def __call__(self) -> RecordingSession:
+        return RecordingSession(self, self.session())
+
+    async def wait(self, timeout: float) -> None:
+        await wait_for_change(self.session, timeout)
+
+    def write(self, id: int, op: str, *args: typing.Any) -> None:
+        event = [round(asyncio.get_running_loop().time() - self.begin, 6), id, op, *args]
+        self.file.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_events(path: str) -> typing.Iterator[list[typing.Any]]:
+    with gzip.open(path, "rt") as file:
+        for line in file:
+            yield json.loads(line)
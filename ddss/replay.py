@@ -0,0 +1,52 @@
+import asyncio
+from .orm import initialize_database, fetch_after, insert_or_ignore_many, Base
+from .record import read_events
+
+
+async def main(addr, engine=None, session=None, path: str = "ddss.rec", speed: float = 1.0):
+    if engine is None or session is None:
+        engine, session = await initialize_database(addr)
+
+    models = {mapper.class_.__tablename__: mapper.class_ for mapper in Base.registry.mappers}
+    reads = 0
+    writes = 0
+
+    async def play(queue: asyncio.Queue) -> None:
+        nonlocal reads, writes
+        async with session() as sess:
+            while (event := await queue.get()) is not None:
+                match event:
+                    case ["r", table, after]:
+                        reads += len(await fetch_after(sess, models[table], after))
+                    case ["w", table, data]:
+                        writes += len(data)
+                        await insert_or_ignore_many(sess, models[table], data)
+                    case ["c"]:
+                        await sess.commit()
+
+    try:
+        loop = asyncio.get_running_loop()
+        begin = loop.time()
+        queues: dict[int, asyncio.Queue] = {}
+        tasks = []
+        recorded = 0.0
+        # 每个记录的会话在各自的任务中按原顺序重放, 以保留原有的并发
+        for recorded, id, op, *args in read_events(path):
+            if speed > 0 and (delay := begin + recorded / speed - loop.time()) > 0:
+                await asyncio.sleep(delay)
+            if op == "o":
+                queues[id] = asyncio.Queue()
+                tasks.append(asyncio.create_task(play(queues[id])))
+            elif op == "x":
+                queues.pop(id).put_nowait(None)
+            elif id in queues:
+                queues[id].put_nowait([op, *args])
+        for queue in queues.values():
+            queue.put_nowait(None)
+        await asyncio.gather(*tasks)
+        print(
+            f"replay: {len(tasks)} sessions, {reads} rows read, {writes} rows written, "
+            f"{loop.time() - begin:.3f}s (recorded {recorded:.3f}s)"
+        )
+    finally:
+        await engine.dispose()
@@ -0,0 +1,89 @@
+import asyncio
+from .orm import wait_for_change
+
+default_priorities = {"input": 4.0, "output": 2.0, "ds": 1.0, "egg": 1.0}
+
+
+class Scheduler:
+    def __init__(
+        self,
+        interval: float = 0.1,
+        max_interval: float = 0.5,
+        backoff: float = 2.0,
+        depth: int = 100,
+        priorities: dict[str, float] | None = None,
+    ) -> None:
+        self.interval: float = interval
+        self.max_interval: float = max_interval
+        self.backoff: float = backoff
+        self.depth: int = depth
+        self.priorities: dict[str, float] = default_priorities | (priorities or {})
+        self.idle: dict[str, int] = {}
+        # 组件最近一次忙碌的时间和耗时
+        self.active: dict[str, tuple[float, float]] = {}
+        self.wakeups: dict[str, asyncio.Event] = {}
+
+    def priority(self, name: str) -> float:
+        return self.priorities.get(name, 1.0)
+
+    def notify(self, name: str, duration: float = 0.0) -> None:
+        # 组件写入了新数据, 唤醒同一进程中正在等待的其他组件, 并重置它们的退避
+        self.active[name] = (asyncio.get_running_loop().time(), duration)
+        for other in self.idle:
+            if other != name:
+                self.idle[other] = 0
+        for other, event in self.wakeups.items():
+            if other != name:
+                event.set()
+
+    def idle_delay(self, name: str) -> float:
+        rounds = self.idle.get(name, 0)
+        delay = min(self.interval * self.backoff**rounds, self.max_interval)
+        if delay < self.max_interval:
+            self.idle[name] = rounds + 1
+        return delay
+
+    def busy_delay(self, name: str, duration: float, rows: int) -> float:
+        # 只让步给最近忙碌过的更高优先级组件, 让步时间按优先级分配, 且不超过它们一轮的耗时
+        now = asyncio.get_running_loop().time()
+        priority = self.priority(name)
+        higher = [
+            (self.priority(other), spent)
+            for other, (time, spent) in self.active.items()
+            if other != name and now - time < self.max_interval and self.priority(other) > priority
+        ]
+        if not higher:
+            return 0.0
+        share = priority / (priority + sum(p for p, _ in higher))
+        delay = min(duration * (1 - share) / share, sum(spent for _, spent in higher), self.max_interval)
+        # 积压越多, 让步越少
+        if self.depth > 0:
+            delay *= max(0.0, 1 - rows / self.depth)
+        return delay
+
+    async def pause(self, name: str, session, duration: float, count: int, rows: int, written: int = 0) -> None:
+        if count != 0:
+            self.idle[name] = 0
+            if written != 0:
+                self.notify(name, duration)
+            else:
+                self.active[name] = (asyncio.get_running_loop().time(), duration)
+            if (delay := self.busy_delay(name, duration, rows)) > 0:
+                await asyncio.sleep(delay)
+            return
+        if rows != 0:
+            # 读到了新数据但没有产生结果, 仍按最短间隔轮询
+            self.idle[name] = 0
+        await self.wait(name, session, max(0.0, self.idle_delay(name) - duration))
+
+    async def wait(self, name: str, session, delay: float) -> None:
+        event = self.wakeups.setdefault(name, asyncio.Event())
+        if not event.is_set():
+            tasks = [asyncio.create_task(wait_for_change(session, delay)), asyncio.create_task(event.wait())]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        event.clear()
@@ -0,0 +1,318 @@
+import asyncio
+import typing
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from .orm import (
+    fetch_after,
+    count_rows,
+    insert_or_ignore_many,
+    load_cursor,
+    save_cursor,
+    Base,
+    Facts,
+    Ideas,
+    Quarantine,
+)
+from .orm import Terms, SharedFacts, SharedIdeas
+from .utility import str_term_get_tokens
+
+
+class Row(typing.NamedTuple):
+    id: int
+    data: str
+
+
+class _Table:
+    def __init__(self) -> None:
+        self.rows: list[Row] = []
+        self.index: dict[str, int] = {}
+
+
+class MemorySession:
+    def __init__(self, store: "MemoryStore") -> None:
+        self.store: MemoryStore = store
+        self.pending: dict[type[Base], dict[str, None]] = {}
+        self.cursors: dict[str, tuple[int, int]] = {}
+
+    async def __aenter__(self) -> "MemorySession":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.pending.clear()
+        self.cursors.clear()
+
+    async def fetch_after(self, model: type[Base], after: int) -> list[Row]:
+        # 行号从 1 开始连续递增, 因此可以直接按位置切片
+        return self.store.tables[model].rows[max(after, 0) :]
+
+    async def count_rows(self, model: type[Base]) -> int:
+        return len(self.store.tables[model].rows)
+
+    async def load_cursor(self, name: str) -> tuple[int, int]:
+        return self.cursors.get(name, self.store.cursors.get(name, (-1, -1)))
+
+    async def save_cursor(self, name: str, fact: int, idea: int) -> None:
+        self.cursors[name] = (fact, idea)
+
+    async def insert_or_ignore_many(self, model: type[Base], data: typing.Iterable[str]) -> int:
+        pending = self.pending.setdefault(model, {})
+        index = self.store.tables[model].index
+        inserted = 0
+        for item in data:
+            if item not in index and item not in pending:
+                pending[item] = None
+                inserted += 1
+        return inserted
+
+    async def commit(self) -> None:
+        for model, data in self.pending.items():
+            table = self.store.tables[model]
+            for item in data:
+                if item not in table.index:
+                    row = Row(len(table.rows) + 1, item)
+                    table.rows.append(row)
+                    table.index[item] = row.id
+        if self.pending:
+            self.store.changed.set()
+            self.store.changed = asyncio.Event()
+        self.pending.clear()
+        self.store.cursors.update(self.cursors)
+        self.cursors.clear()
+
+
+class MemoryStore:
+    def __init__(self) -> None:
+        self.tables: dict[type[Base], _Table] = {Facts: _Table(), Ideas: _Table(), Quarantine: _Table()}
+        self.changed: asyncio.Event = asyncio.Event()
+        self.persisted: dict[type[Base], int] = {model: 0 for model in self.tables}
+        self.cursors: dict[str, tuple[int, int]] = {}
+
+    def __call__(self) -> MemorySession:
+        return MemorySession(self)
+
+    async def dispose(self) -> None:
+        pass
+
+    def data(self, model: type[Base]) -> list[str]:
+        return [row.data for row in self.tables[model].rows]
+
+    async def wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except TimeoutError:
+            pass
+
+    async def flush(self, session) -> None:
+        persisted = {}
+        async with session() as sess:
+            for model, table in self.tables.items():
+                persisted[model] = len(table.rows)
+                await insert_or_ignore_many(sess, model, [row.data for row in table.rows[self.persisted[model] :]])
+            await sess.commit()
+        self.persisted.update(persisted)
+
+    async def persist(self, session, interval: float = 1.0) -> None:
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.flush(session)
+        finally:
+            await self.flush(session)
+
+
+shared_models: dict[type[Base], type[Base]] = {Facts: SharedFacts, Ideas: SharedIdeas}
+
+# 列表子项表示为其子项序号的元组, 因此很深的项在哈希和比较时也不会递归
+Node = str | tuple[int, ...]
+
+
+def _str_term_get_node(data: str, nodes: dict[Node, int], heights: list[int]) -> int:
+    # 解析时为每个不同的子项分配序号并记录其高度, 子项总是先于包含它的列表得到序号
+    def intern(node: Node) -> int:
+        if (index := nodes.get(node)) is None:
+            index = nodes[node] = len(heights)
+            heights.append(0 if isinstance(node, str) else 1 + max((heights[child] for child in node), default=0))
+        return index
+
+    stack: list[list[int]] = [[]]
+    for token in str_term_get_tokens(data):
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            node = tuple(stack.pop())
+            stack[-1].append(intern(node))
+        else:
+            stack[-1].append(intern(token))
+    (index,) = stack[0]
+    return index
+
+
+def _reference_get_ids(reference: str) -> list[int]:
+    premises, _, conclusion = reference.split("/")
+    return [*map(int, premises.split()), int(conclusion)]
+
+
+class SharedSession:
+    def __init__(self, store: "SharedStore", sess: AsyncSession) -> None:
+        self.store: SharedStore = store
+        self.sess: AsyncSession = sess
+        # 本次事务中新编码的子项编号
+        self.ids: dict[str, int] = {}
+
+    def __getattr__(self, name: str) -> typing.Any:
+        # 租约和游标等其他表仍然直接使用数据库会话
+        return getattr(self.sess, name)
+
+    async def __aenter__(self) -> "SharedSession":
+        await self.sess.__aenter__()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.ids.clear()
+        await self.sess.__aexit__(*args)
+
+    async def fetch_after(self, model: type[Base], after: int) -> list[Row]:
+        if model not in shared_models:
+            return list(await fetch_after(self.sess, model, after))
+        shared = shared_models[model]
+        rows = (await self.sess.execute(select(shared.id, shared.data).where(shared.id > after))).all()
+        texts = await self.store.texts(self.sess, {id for _, data in rows for id in _reference_get_ids(data)})
+        return [Row(id, self.store.rebuild(data, texts)) for id, data in rows]
+
+    async def count_rows(self, model: type[Base]) -> int:
+        return await count_rows(self.sess, shared_models.get(model, model))
+
+    async def load_cursor(self, name: str) -> tuple[int, int]:
+        return await load_cursor(self.sess, name)
+
+    async def save_cursor(self, name: str, fact: int, idea: int) -> None:
+        await save_cursor(self.sess, name, fact, idea)
+
+    async def insert_or_ignore_many(self, model: type[Base], data: typing.Iterable[str]) -> int:
+        if model not in shared_models:
+            return await insert_or_ignore_many(self.sess, model, data)
+        references = await self.store.encode(self.sess, list(dict.fromkeys(data)), self.ids)
+        return await insert_or_ignore_many(self.sess, shared_models[model], references)
+
+    async def commit(self) -> None:
+        # 子项的编号在提交成功之后才能放入缓存, 否则回滚会留下无效的编号
+        await self.sess.commit()
+        for key, id in self.ids.items():
+            self.store.remember(self.store.ids, key, id)
+        self.ids.clear()
+
+
+class SharedStore:
+    def __init__(self, session: async_sessionmaker[AsyncSession], capacity: int = 65536, chunk: int = 500) -> None:
+        self.session: async_sessionmaker[AsyncSession] = session
+        self.capacity: int = capacity
+        self.chunk: int = chunk
+        # 子项内容到编号, 以及编号到完整文本的缓存
+        self.ids: OrderedDict[str, int] = OrderedDict()
+        self.cache: OrderedDict[int, str] = OrderedDict()
+
+    def __call__(self) -> SharedSession:
+        return SharedSession(self, self.session())
+
+    async def wait(self, timeout: float) -> None:
+        await asyncio.sleep(timeout)
+
+    def remember(self, cache: OrderedDict, key: typing.Any, value: typing.Any) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.capacity:
+            cache.popitem(last=False)
+
+    async def encode(self, sess: AsyncSession, rules: list[str], ids: dict[str, int]) -> list[str]:
+        # 规则的每一行是一个项, 最后两行分别是横线和结论
+        lines = [rule.splitlines() for rule in rules]
+        nodes: dict[Node, int] = {}
+        heights: list[int] = []
+        trees = [[_str_term_get_node(line, nodes, heights) for line in [*rule[:-2], rule[-1]]] for rule in lines]
+        levels: dict[int, list[Node]] = {}
+        for node, index in nodes.items():
+            levels.setdefault(heights[index], []).append(node)
+
+        # 子项按高度逐层写入, 每个列表子项记录其各个子项的编号
+        term_ids = [0] * len(heights)
+        for height in sorted(levels):
+            keys = {}
+            for node in levels[height]:
+                keys[nodes[node]] = (
+                    node if isinstance(node, str) else f"({' '.join(str(term_ids[child]) for child in node)})"
+                )
+            missing = []
+            for key in keys.values():
+                if key in self.ids:
+                    self.ids.move_to_end(key)
+                    ids[key] = self.ids[key]
+                elif key not in ids:
+                    missing.append(key)
+            await insert_or_ignore_many(sess, Terms, missing)
+            for begin in range(0, len(missing), self.chunk):
+                part = missing[begin : begin + self.chunk]
+                ids.update((await sess.execute(select(Terms.data, Terms.id).where(Terms.data.in_(part)))).all())
+            for index, key in keys.items():
+                term_ids[index] = ids[key]
+
+        references = []
+        for rule, tree in zip(lines, trees):
+            *premises, conclusion = (str(term_ids[index]) for index in tree)
+            references.append(f"{' '.join(premises)}/{len(rule[-2])}/{conclusion}")
+        return references
+
+    async def texts(self, sess: AsyncSession, ids: set[int]) -> dict[int, str]:
+        texts = {}
+        for id in ids:
+            if id in self.cache:
+                self.cache.move_to_end(id)
+                texts[id] = self.cache[id]
+        # 逐层读取缺失的子项, 直到所有子项的内容都已知
+        data: dict[int, str] = {}
+        missing = list(ids - texts.keys())
+        while missing:
+            rows = []
+            for begin in range(0, len(missing), self.chunk):
+                part = missing[begin : begin + self.chunk]
+                rows += (await sess.execute(select(Terms.id, Terms.data).where(Terms.id.in_(part)))).all()
+            data.update(rows)
+            children = {int(child) for _, value in rows if value.startswith("(") for child in value[1:-1].split()}
+            missing = []
+            for child in children:
+                if child in texts or child in data:
+                    continue
+                # 缓存中的子项立即取出, 之后的等待和写入缓存都可能将其淘汰
+                if (cached := self.cache.get(child)) is not None:
+                    texts[child] = cached
+                else:
+                    missing.append(child)
+
+        def text(id: int) -> str:
+            # 使用显式的栈自底向上拼接, 很深的项不会超出递归深度
+            stack = [id]
+            while stack:
+                current = stack[-1]
+                if current in texts:
+                    stack.pop()
+                elif not (value := data[current]).startswith("("):
+                    texts[current] = value
+                    stack.pop()
+                elif pending := [child for child in map(int, value[1:-1].split()) if child not in texts]:
+                    stack.extend(pending)
+                else:
+                    texts[current] = f"({' '.join(texts[int(child)] for child in value[1:-1].split())})"
+                    stack.pop()
+            return texts[id]
+
+        # 全部拼接完成之后再写入缓存, 以免写入时淘汰后续拼接需要的子项
+        for id in ids:
+            text(id)
+        for id in ids:
+            self.remember(self.cache, id, texts[id])
+        return texts
+
+    def rebuild(self, reference: str, texts: dict[int, str]) -> str:
+        premises, dashes, conclusion = reference.split("/")
+        lines = [*(texts[int(id)] for id in premises.split()), "-" * int(dashes), texts[int(conclusion)]]
+        return "".join(f"{line}\n" for line in lines)
@@ -0,0 +1,61 @@
+import os
+import json
+import asyncio
+import pathlib
+import typing
+
+
+class Tracer:
+    def __init__(self, path: str) -> None:
+        self.path: pathlib.Path = pathlib.Path(path)
+        self.events: list[dict[str, typing.Any]] = []
+        self.threads: dict[str, int] = {}
+        self.pid: int = os.getpid()
+
+    def span(self, component: str, name: str, begin: float, end: float, **args: typing.Any) -> None:
+        # 每个组件显示为一个线程, 时间戳使用事件循环的时钟, 单位为微秒
+        tid = self.threads.setdefault(component, len(self.threads) + 1)
+        self.events.append(
+            {
+                "name": name,
+                "cat": component,
+                "ph": "X",
+                "ts": begin * 1e6,
+                "dur": (end - begin) * 1e6,
+                "pid": self.pid,
+                "tid": tid,
+                "args": args,
+            }
+        )
+
+    def phases(self, component: str, stamps: list[tuple[str, float]], **args: dict[str, typing.Any]) -> None:
+        self.span(component, "iteration", stamps[0][1], stamps[-1][1])
+        for (_, begin), (phase, end) in zip(stamps, stamps[1:]):
+            self.span(component, phase, begin, end, **args.get(phase, {}))
+
+    def _take(self) -> str:
+        events, self.events = self.events, []
+        return "".join(f"{json.dumps(event)},\n" for event in events)
+
+    def _append(self, text: str) -> None:
+        with self.path.open("a") as file:
+            file.write(text)
+
+    def close(self) -> None:
+        # 线程名称作为最后的元数据事件写入, 之后补全 JSON 数组
+        names = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": component}}
+            for component, tid in self.threads.items()
+        ]
+        names.append({"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "ddss"}})
+        self._append(self._take() + ",\n".join(json.dumps(event) for event in names) + "\n]\n")
+
+    async def run(self, interval: float = 1.0) -> None:
+        self.path.write_text("[\n")
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await asyncio.to_thread(self._append, self._take())
+        finally:
+            self.close()
+            print(f"trace: {self.path}")
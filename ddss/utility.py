@@ -1,4 +1,57 @@
+import re
+import typing
+
+
 def str_rule_get_str_idea(data: str) -> str | None:
     if not data.startswith("--"):
         return f"----\n{data.splitlines()[0]}\n"
     return None
+
+
+_token = re.compile(r"[()]|[^\s()]+")
+
+
+def str_term_get_tokens(data: str) -> list[str]:
+    return _token.findall(data)
+
+
+def str_rule_get_shape(data: str) -> tuple[int, int, int]:
+    depth = 0
+    size = 0
+    variables = set()
+    for line in data.splitlines():
+        if line.startswith("--"):
+            continue
+        level = 0
+        for token in str_term_get_tokens(line):
+            if token == "(":
+                level += 1
+                size += 1
+                depth = max(depth, level)
+            elif token == ")":
+                level -= 1
+            else:
+                size += 1
+                if token.startswith("`"):
+                    variables.add(token)
+    return depth, size, len(variables)
+
+
+def parse_lines(lines: typing.Iterable[str]) -> tuple[list[str], list[str]]:
+    # 只有解析输入时才需要 apyds_bnf, 引擎和 main 不必加载它
+    from apyds_bnf import parse
+
+    rules = []
+    errors = []
+    for line in lines:
+        data = line.strip()
+        if data == "":
+            continue
+        if data.startswith("//"):
+            continue
+
+        try:
+            rules.append(parse(data))
+        except Exception as e:
+            errors.append(f"error: {e}")
+    return rules, errors
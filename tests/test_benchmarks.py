@@ -0,0 +1,89 @@
+import sys
+import json
+import shutil
+import tempfile
+import pathlib
+import subprocess
+import pytest
+
+root = pathlib.Path(__file__).parent.parent
+benchmarks = root / "benchmarks"
+
+
+def test_egraph_benchmarks():
+    """Test that the e-graph benchmarks run at a small scale and write comparable JSON results."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output = pathlib.Path(tmpdir) / "egraph.json"
+        command = [sys.executable, str(benchmarks / "egraph.py"), "-s", "5", "--repeat", "1", "-o", str(output)]
+        subprocess.run(command, check=True, capture_output=True)
+        results = json.loads(output.read_text())["results"]
+        assert {result["workload"] for result in results} == {"chain", "congruence", "variables", "eclass"}
+        assert all(result["results"] > 0 for result in results)
+
+        compared = subprocess.run(
+            [*command[:-2], "--baseline", str(output)], check=True, capture_output=True, text=True
+        ).stdout
+        assert "x)" in compared
+
+
+def test_saturation_benchmarks():
+    """Test that the end-to-end harness saturates each workload and reports its statistics."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output = pathlib.Path(tmpdir) / "saturation.json"
+        command = [sys.executable, str(benchmarks / "saturation.py"), "-s", "2", "--fanout", "2", "-o", str(output)]
+        subprocess.run(command, check=True, capture_output=True)
+        results = {result["workload"]: result for result in json.loads(output.read_text())["results"]}
+        assert set(results) == {"closure", "rewrite", "chain"}
+        # Derived facts come on top of the loaded ones: 4 lines for closure, 7 for chain
+        assert results["closure"]["facts"] > 4
+        assert results["chain"]["facts"] > 7
+        assert all(result["round_trips"] > 0 and result["peak_rss"] > 0 for result in results.values())
+
+
+def test_parity_benchmarks():
+    """Test that the parity harness runs a deployment through the command line and checks its facts."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output = pathlib.Path(tmpdir) / "parity.json"
+        command = [sys.executable, str(benchmarks / "parity.py"), "--setup", "py", "-w", "closure", "-s", "2"]
+        command += ["--startup", "2", "--quiet", "0.5", "-o", str(output)]
+        stdout = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        assert "identical" in stdout
+        (result,) = json.loads(output.read_text())["results"]
+        assert result["setup"] == "load=py,ds=py,egg=py,dump=py"
+        assert "----\n(function path c0 c2)\n" in result["data"]
+        assert result["dumped"] == result["facts"]
+
+
+def test_parity_loads_outside_benchmarks():
+    """Test that the parity harness finds its workloads when loaded from another directory and not as a script."""
+    code = (
+        "import importlib.util\n"
+        f"spec = importlib.util.spec_from_file_location('parity', {str(benchmarks / 'parity.py')!r})\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(module)\n"
+        "print(sorted(module.workloads))"
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stdout = subprocess.run([sys.executable, "-c", code], cwd=tmpdir, check=True, capture_output=True, text=True)
+    assert "closure" in stdout.stdout
+
+
+@pytest.mark.skipif(
+    shutil.which("node") is None or not (root / "dist" / "index.js").exists(),
+    reason="requires node and the TypeScript build in dist/",
+)
+def test_parity_benchmarks_typescript():
+    """Test that the TypeScript implementation, alone and mixed with Python, derives the same facts."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output = pathlib.Path(tmpdir) / "parity.json"
+        command = [sys.executable, str(benchmarks / "parity.py"), "--setup", "py", "ts", "py,egg=ts"]
+        command += ["-w", "closure", "-s", "2", "--startup", "5", "--quiet", "1", "-o", str(output)]
+        stdout = subprocess.run(command, cwd=root, check=True, capture_output=True, text=True).stdout
+        assert "DIFFERENT" not in stdout
+        results = json.loads(output.read_text())["results"]
+        assert [result["setup"] for result in results] == [
+            "load=py,ds=py,egg=py,dump=py",
+            "load=ts,ds=ts,egg=ts,dump=ts",
+            "load=py,ds=py,egg=ts,dump=py",
+        ]
+        assert len({tuple(result["data"]) for result in results}) == 1
@@ -0,0 +1,48 @@
+from ddss.cache import Cache
+
+
+def test_cache_hit_and_miss():
+    """Test that a key is a miss until it is added, and a hit afterwards."""
+    cache = Cache(4)
+    assert not cache.contains("facts", "----\na\n")
+    assert not cache.contains("facts", "----\na\n")
+    cache.add("facts", "----\na\n")
+    assert cache.contains("facts", "----\na\n")
+    assert cache.hits == 1
+    assert cache.misses == 2
+    assert cache.hit_rate == 1 / 3
+
+
+def test_cache_separates_tables():
+    """Test that the same data in different tables is cached independently."""
+    cache = Cache(4)
+    cache.add("facts", "----\na\n")
+    assert not cache.contains("ideas", "----\na\n")
+
+
+def test_cache_add_does_not_count():
+    """Test that rows known from the database are cached without touching the statistics."""
+    cache = Cache(4)
+    cache.add("facts", "----\na\n")
+    assert cache.hits == 0 and cache.misses == 0
+    assert cache.contains("facts", "----\na\n")
+
+
+def test_cache_evicts_least_recently_used():
+    """Test that the cache is bounded and evicts the least recently used entry."""
+    cache = Cache(2)
+    cache.add("facts", "a")
+    cache.add("facts", "b")
+    cache.contains("facts", "a")
+    cache.add("facts", "c")
+    assert len(cache.entries) == 2
+    assert cache.contains("facts", "a")
+    assert not cache.contains("facts", "b")
+
+
+def test_cache_disabled():
+    """Test that a zero capacity cache never reports a hit."""
+    cache = Cache(0)
+    cache.add("facts", "a")
+    assert not cache.contains("facts", "a")
+    assert cache.hit_rate == 0.0
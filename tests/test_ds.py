@@ -1,11 +1,16 @@
 import asyncio
 import tempfile
 import pathlib
+from unittest.mock import patch
 import pytest
 import pytest_asyncio
 from sqlalchemy import select
-from ddss.orm import initialize_database, Facts, Ideas
+from ddss.orm import initialize_database, fetch_after, Facts, Ideas, Quarantine, Workers
 from ddss.ds import main
+from ddss.lease import Lease
+from ddss.limit import Limits
+from ddss.schedule import Scheduler
+from ddss.metrics import Metrics
 
 
 @pytest_asyncio.fixture
@@ -190,3 +195,325 @@ async def test_ds_duplicate_facts_not_added(temp_db):
     assert len(facts_list) == 5
     facts_data = [f.data for f in facts_list]
     assert facts_data.count("----\nc\n") == 1  # Should only appear once
+
+
+@pytest.mark.asyncio
+async def test_ds_partitioned_workers(temp_db):
+    """Test that two partitioned ds workers together derive everything a single worker would."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        for name in "abcdefgh":
+            sess.add(Facts(data=f"{name}\n----\n{name}{name}\n"))
+            sess.add(Facts(data=f"----\n{name}\n"))
+        await sess.commit()
+
+    first = Lease("ds", "first", ttl=0.6)
+    second = Lease("ds", "second", ttl=0.6)
+    tasks = [
+        asyncio.create_task(main(addr, engine, session, lease=first)),
+        asyncio.create_task(main(addr, engine, session, lease=second)),
+    ]
+    await asyncio.sleep(0.6)
+    # Both workers have seen each other and split the rules
+    assert first.members == second.members == ["ds-first", "ds-second"]
+    assert first.owned & second.owned == set()
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async with session() as sess:
+        facts_data = set(await sess.scalars(select(Facts.data)))
+        workers = list(await sess.scalars(select(Workers)))
+
+    for name in "abcdefgh":
+        assert f"----\n{name}{name}\n" in facts_data
+    assert workers == []
+
+
+async def run_partitioned(workers):
+    """Run ds with the given number of partitioned workers and return the facts and the rules submitted in total."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine, session = await initialize_database(f"sqlite+aiosqlite:///{tmpdir}/test.db")
+        async with session() as sess:
+            for i in range(8):
+                sess.add(Facts(data=f"(p{i} `x)\n(q{i} `x)\n----\n(r{i} `x)\n"))
+                sess.add(Facts(data=f"----\n(p{i} a)\n"))
+                sess.add(Facts(data=f"----\n(q{i} a)\n"))
+            await sess.commit()
+
+        metrics = [Metrics() for _ in range(workers)]
+        tasks = [
+            asyncio.create_task(
+                main(
+                    None,
+                    engine,
+                    session,
+                    lease=Lease("ds", f"w{k}", ttl=0.6) if workers > 1 else None,
+                    metrics=metrics[k],
+                    scheduler=Scheduler(max_interval=0.1),
+                )
+            )
+            for k in range(workers)
+        ]
+        await asyncio.sleep(1.0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        async with session() as sess:
+            facts = set(await sess.scalars(select(Facts.data)))
+        await engine.dispose()
+    # Cache hits are submissions too: a worker derived a row it or another worker had already produced
+    submitted = sum(
+        m.counters["ddss_rows_written_total"][(("component", "ds"), ("table", "facts"))]
+        + m.counters["ddss_duplicates_total"][(("component", "ds"),)]
+        for m in metrics
+    )
+    return facts, submitted
+
+
+@pytest.mark.asyncio
+async def test_ds_partitioned_workers_expand_derived_rules_twice():
+    """Test the known redundancy: a derived rule is expanded by its producer and again by the owner of its partition."""
+    single, single_submitted = await run_partitioned(1)
+    split, split_submitted = await run_partitioned(2)
+    assert split == single
+    assert split_submitted > single_submitted
+
+
+@pytest.mark.asyncio
+async def test_ds_drops_rules_of_lost_partitions(temp_db):
+    """Test that a worker stops applying rules of partitions that moved to a new worker."""
+    addr, engine, session = temp_db
+
+    names = [f"r{i}" for i in range(16)]
+    async with session() as sess:
+        for name in names:
+            sess.add(Facts(data=f"{name}\n----\n{name}{name}\n"))
+        await sess.commit()
+
+    # The first worker owns every rule until a second worker joins
+    first = Lease("ds", "first", ttl=0.6)
+    task = asyncio.create_task(main(addr, engine, session, lease=first))
+    await asyncio.sleep(0.3)
+    assert len(first.owned) == first.partitions
+
+    second = Lease("ds", "second", ttl=0.6)
+
+    async def keep_alive():
+        while True:
+            second.renewed = 0.0
+            await second.renew(session)
+            await asyncio.sleep(0.1)
+
+    alive = asyncio.create_task(keep_alive())
+    await asyncio.sleep(0.5)
+    assert first.members == ["ds-first", "ds-second"]
+
+    async with session() as sess:
+        for name in names:
+            sess.add(Facts(data=f"----\n{name}\n"))
+        await sess.commit()
+    await asyncio.sleep(0.5)
+    for running in (task, alive):
+        running.cancel()
+    await asyncio.gather(task, alive, return_exceptions=True)
+
+    async with session() as sess:
+        facts_data = set(await sess.scalars(select(Facts.data)))
+    owned = [name for name in names if first.partition(f"{name}\n----\n{name}{name}\n") not in second.owned]
+    assert 0 < len(owned) < len(names)
+    for name in names:
+        assert (f"----\n{name}{name}\n" in facts_data) == (name in owned)
+
+
+@pytest.mark.asyncio
+async def test_ds_rescans_only_when_ownership_changes(temp_db):
+    """Test that a worker rescans old facts once per real ownership change, not on every heartbeat."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        for i in range(16):
+            sess.add(Facts(data=f"r{i}\n----\ns{i}\n"))
+        await sess.commit()
+
+    # Both workers are registered before the engine starts, so the first round already skips half of the rules
+    first = Lease("ds", "first", ttl=0.3)
+    second = Lease("ds", "second", ttl=0.3)
+    await second.renew(session)
+    rescans = []
+
+    async def counting_fetch_after(sess, model, after):
+        if after == -1:
+            rescans.append(model)
+        return await fetch_after(sess, model, after)
+
+    async def keep_alive():
+        while True:
+            second.renewed = 0.0
+            await second.renew(session)
+            await asyncio.sleep(0.05)
+
+    with patch("ddss.ds.fetch_after", counting_fetch_after):
+        alive = asyncio.create_task(keep_alive())
+        task = asyncio.create_task(main(addr, engine, session, lease=first, scheduler=Scheduler(max_interval=0.1)))
+        await asyncio.sleep(0.8)
+        # Only the first round reads from the start, heartbeats without a change in membership never rescan
+        assert rescans == [Facts]
+
+        alive.cancel()
+        await asyncio.gather(alive, return_exceptions=True)
+        async with session() as sess:
+            await second.release(sess)
+            await sess.commit()
+        async with session() as sess:
+            for i in range(16):
+                sess.add(Facts(data=f"----\nr{i}\n"))
+            await sess.commit()
+        await asyncio.sleep(0.5)
+        task.cancel()
+        await task
+
+    # Taking over the second worker's partitions rescans once and applies its skipped rules
+    assert rescans == [Facts, Facts]
+    async with session() as sess:
+        facts_data = set(await sess.scalars(select(Facts.data)))
+    for i in range(16):
+        assert f"----\ns{i}\n" in facts_data
+
+
+async def run_ds(addr, engine, session, **kwargs):
+    task = asyncio.create_task(main(addr, engine, session, **kwargs))
+    await asyncio.sleep(0.3)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    async with session() as sess:
+        return set(await sess.scalars(select(Facts.data)))
+
+
+@pytest.mark.asyncio
+async def test_ds_goal_directed_skips_irrelevant_rules(temp_db):
+    """Test that goal-directed ds only applies rules whose conclusion matches an open idea."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="a\n----\nb\n"))
+        sess.add(Facts(data="a\n----\nc\n"))
+        sess.add(Facts(data="----\na\n"))
+        sess.add(Ideas(data="----\nb\n"))
+        await sess.commit()
+
+    facts_data = await run_ds(addr, engine, session, goal_directed=True)
+    assert "----\nb\n" in facts_data
+    assert "----\nc\n" not in facts_data
+
+
+@pytest.mark.asyncio
+async def test_ds_goal_directed_admits_rules_for_new_ideas(temp_db):
+    """Test that a rule held back becomes active once a matching idea appears."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="a\n----\n(f c)\n"))
+        sess.add(Facts(data="----\na\n"))
+        await sess.commit()
+
+    task = asyncio.create_task(main(addr, engine, session, goal_directed=True))
+    await asyncio.sleep(0.2)
+    async with session() as sess:
+        assert "----\n(f c)\n" not in set(await sess.scalars(select(Facts.data)))
+        sess.add(Ideas(data="----\n(f `x)\n"))
+        await sess.commit()
+    await asyncio.sleep(0.2)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+    async with session() as sess:
+        assert "----\n(f c)\n" in set(await sess.scalars(select(Facts.data)))
+
+
+@pytest.mark.asyncio
+async def test_ds_goal_directed_budget(temp_db):
+    """Test that a relevance budget still admits irrelevant rules over time."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="a\n----\nb\n"))
+        sess.add(Facts(data="a\n----\nc\n"))
+        sess.add(Facts(data="----\na\n"))
+        await sess.commit()
+
+    facts_data = await run_ds(addr, engine, session, goal_directed=True, budget=1)
+    assert "----\nb\n" in facts_data
+    assert "----\nc\n" in facts_data
+
+
+@pytest.mark.asyncio
+async def test_ds_limits_stop_runaway_rules(temp_db):
+    """Test that a depth limit stops a recursive rule and quarantines the rejected facts."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="(nat `x)\n----\n(nat (s `x))\n"))
+        sess.add(Facts(data="----\n(nat z)\n"))
+        await sess.commit()
+
+    limits = Limits(depth=3)
+    facts_data = await run_ds(addr, engine, session, limits=limits, quarantine=True)
+    assert "----\n(nat (s (s z)))\n" in facts_data
+    assert "----\n(nat (s (s (s z))))\n" not in facts_data
+    assert limits.rejected["depth"] >= 1
+
+    async with session() as sess:
+        quarantined = list(await sess.scalars(select(Quarantine.data)))
+    assert "----\n(nat (s (s (s z))))\n" in quarantined
+    assert all(data.count("(") > 3 for data in quarantined)
+
+
+@pytest.mark.asyncio
+async def test_ds_buffer_limit_stops_search(temp_db):
+    """Test that a buffer limit stops the search engine itself from expanding a recursive rule."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="(nat `x)\n----\n(nat (s `x))\n"))
+        sess.add(Facts(data="----\n(nat z)\n"))
+        await sess.commit()
+
+    facts_data = await run_ds(addr, engine, session, limits=Limits(buffer=60))
+    assert "----\n(nat (s (s (s z))))\n" in facts_data
+    assert "----\n(nat (s (s (s (s z)))))\n" not in facts_data
+
+
+@pytest.mark.asyncio
+async def test_ds_generic_dialect(temp_db):
+    """Test that ds stores several conclusions per round through the fallback for dialects without upserts."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        for data in ["a\n----\nb\n", "a\n----\nc\n", "a\n----\nd\n", "b\nx\n----\ne\n", "----\na\n"]:
+            sess.add(Facts(data=data))
+        await sess.commit()
+
+    with patch.object(engine.dialect, "name", "generic"):
+        task = asyncio.create_task(main(addr, engine, session))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        await task
+
+    async with session() as sess:
+        facts = set(await sess.scalars(select(Facts.data)))
+        ideas = set(await sess.scalars(select(Ideas.data)))
+    assert {"----\nb\n", "----\nc\n", "----\nd\n", "x\n----\ne\n"} <= facts
+    assert "----\nx\n" in ideas
@@ -127,3 +127,31 @@ async def test_dump_with_simple_fact(temp_db, capsys):
     # Check output - unparse converts "----\nsimple\n" to " => simple"
     captured = capsys.readouterr()
     assert "fact:  => simple" in captured.out
+
+
+@pytest.mark.asyncio
+async def test_dump_with_cursor_only_dumps_new_rows(temp_db, capsys):
+    """Test that dump with a cursor exports only rows added since the previous dump under that name."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="a\n----\nb\n"))
+        await sess.commit()
+
+    await main(addr, engine, session, cursor="export")
+    assert "fact: a => b" in capsys.readouterr().out
+
+    async with session() as sess:
+        sess.add(Facts(data="c\n----\nd\n"))
+        sess.add(Ideas(data="x\n----\ny\n"))
+        await sess.commit()
+
+    await main(addr, engine, session, cursor="export")
+    captured = capsys.readouterr().out
+    assert "fact: c => d" in captured
+    assert "idea: x => y" in captured
+    assert "fact: a => b" not in captured
+
+    # A different cursor starts from the beginning
+    await main(addr, engine, session, cursor="other")
+    assert "fact: a => b" in capsys.readouterr().out
@@ -1,11 +1,16 @@
 import asyncio
 import tempfile
 import pathlib
+from unittest.mock import patch
 import pytest
 import pytest_asyncio
 from sqlalchemy import select
-from ddss.orm import initialize_database, Facts, Ideas
+from ddss.orm import initialize_database, Facts, Ideas, Quarantine, Workers
 from ddss.egg import main
+from ddss.lease import Lease
+from ddss.limit import Limits
+from ddss.metrics import Metrics
+from ddss.schedule import Scheduler
 
 
 @pytest_asyncio.fixture
@@ -391,3 +396,119 @@ async def test_egg_complex_situation_with_variables(temp_db):
         assert "----\n(binary == (unary f b) (unary f c))\n" in fact_data
         # Test substitution: f(a) and a=b=c should derive f(c)
         assert "----\n(unary f c)\n" in fact_data
+
+
+@pytest.mark.asyncio
+async def test_egg_partitioned_workers(temp_db):
+    """Test that two partitioned egg workers split the ideas and together resolve all of them."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        for name in "abcdefgh":
+            sess.add(Facts(data=f"----\n(binary == {name} {name}{name})\n"))
+            sess.add(Ideas(data=f"----\n(binary == {name}{name} {name})\n"))
+        await sess.commit()
+
+    first = Lease("egg", "first", ttl=0.6)
+    second = Lease("egg", "second", ttl=0.6)
+    tasks = [
+        asyncio.create_task(main(addr, engine, session, lease=first)),
+        asyncio.create_task(main(addr, engine, session, lease=second)),
+    ]
+    await asyncio.sleep(0.6)
+    # Both workers have seen each other and split the ideas
+    assert first.members == second.members == ["egg-first", "egg-second"]
+    assert first.owned & second.owned == set()
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async with session() as sess:
+        fact_data = set(await sess.scalars(select(Facts.data)))
+        workers = list(await sess.scalars(select(Workers)))
+
+    for name in "abcdefgh":
+        assert f"----\n(binary == {name}{name} {name})\n" in fact_data
+    assert workers == []
+
+
+@pytest.mark.asyncio
+async def test_egg_cache_skips_repeated_facts(temp_db):
+    """Test that facts a variable idea yields again every round are skipped, while new ones still reach the database."""
+    addr, engine, session = temp_db
+
+    # The variable idea stays pending, so egg yields the same facts each round
+    async with session() as sess:
+        sess.add(Facts(data="----\n(binary == a b)\n"))
+        sess.add(Ideas(data="----\n(binary == `x a)\n"))
+        await sess.commit()
+
+    metrics = Metrics()
+    task = asyncio.create_task(main(addr, engine, session, metrics=metrics))
+    await asyncio.sleep(0.3)
+    async with session() as sess:
+        sess.add(Facts(data="----\n(binary == b c)\n"))
+        await sess.commit()
+    await asyncio.sleep(0.3)
+    task.cancel()
+    await task
+
+    async with session() as sess:
+        facts = set(await sess.scalars(select(Facts.data)))
+    assert {"----\n(binary == b a)\n", "----\n(binary == c a)\n"} <= facts
+    # Every derived fact is written once, the repetitions are cache hits
+    assert metrics.counters["ddss_rows_written_total"][("component", "egg"), ("table", "facts")] == len(facts) - 2
+    assert metrics.counters["ddss_duplicates_total"][(("component", "egg"),)] > 0
+
+
+@pytest.mark.asyncio
+async def test_egg_notifies_only_new_rows(temp_db):
+    """Test that egg wakes the other components only in rounds that inserted rows, not for facts derived again."""
+    addr, engine, session = temp_db
+
+    # Without a cache, the variable idea yields the same facts every round
+    async with session() as sess:
+        sess.add(Facts(data="----\n(binary == a b)\n"))
+        sess.add(Ideas(data="----\n(binary == `x a)\n"))
+        await sess.commit()
+
+    scheduler = Scheduler(interval=0.01, max_interval=0.01)
+    with patch.object(scheduler, "notify", wraps=scheduler.notify) as notify:
+        task = asyncio.create_task(main(addr, engine, session, cache_size=0, scheduler=scheduler))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        await task
+
+    assert notify.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_egg_rejects_repeated_facts_once(temp_db):
+    """Test that an oversized fact a variable idea yields every round is rejected, counted and quarantined once."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="----\n(binary == a (f (f b)))\n"))
+        sess.add(Ideas(data="----\n(binary == `x a)\n"))
+        await sess.commit()
+
+    limits = Limits(depth=2)
+    scheduler = Scheduler(interval=0.01, max_interval=0.01)
+    with patch.object(scheduler, "notify", wraps=scheduler.notify) as notify:
+        task = asyncio.create_task(
+            main(addr, engine, session, cache_size=0, limits=limits, quarantine=True, scheduler=scheduler)
+        )
+        await asyncio.sleep(0.3)
+        task.cancel()
+        await task
+
+    assert limits.rejected["depth"] == 1
+    # Only the round that quarantined the fact made progress
+    assert notify.call_count == 1
+    async with session() as sess:
+        assert list(await sess.scalars(select(Quarantine.data))) == ["----\n(binary == (f (f b)) a)\n"]
+        assert "----\n(binary == (f (f b)) a)\n" not in set(await sess.scalars(select(Facts.data)))
@@ -0,0 +1,91 @@
+import asyncio
+import tempfile
+import pathlib
+from unittest.mock import patch
+from io import StringIO
+import pytest
+from ddss.fixpoint import Monitor
+from ddss.main import run
+
+
+@pytest.mark.asyncio
+async def test_monitor_requires_idle_round_after_last_change():
+    """Test that the fixpoint is only reached when every engine idled for a round started after the last change."""
+    monitor = Monitor(["ds", "egg"])
+    loop = asyncio.get_running_loop()
+
+    begin = loop.time()
+    monitor.report("ds", begin, 0)
+    monitor.report("egg", begin, 3)
+    assert not monitor.done.is_set()
+
+    # ds idled in a round that started before egg's change, so it has to idle once more
+    monitor.report("egg", loop.time(), 0)
+    assert not monitor.done.is_set()
+
+    monitor.report("ds", loop.time(), 0)
+    assert monitor.done.is_set()
+    assert await monitor.wait() >= 0
+    assert monitor.busy_rounds == {"ds": 0, "egg": 1}
+    assert monitor.rounds == {"ds": 2, "egg": 2}
+
+
+@pytest.mark.asyncio
+async def test_monitor_without_engines_is_done():
+    """Test that a monitor without engines reaches the fixpoint at once."""
+    monitor = Monitor([])
+    assert monitor.done.is_set()
+
+
+@pytest.mark.asyncio
+async def test_run_to_saturation(capsys):
+    """Test that a saturating run loads, reaches the fixpoint, dumps and exits by itself."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+
+        mock_stdin = StringIO("a => b\nb => c\n=> a\n=> x == y\ny == x => z\n")
+        with patch("sys.stdin", mock_stdin):
+            await asyncio.wait_for(run(addr, ["load", "ds", "egg", "dump"], saturate=True), timeout=10)
+
+    captured = capsys.readouterr()
+    assert "fact:  => c" in captured.out
+    assert "fact:  => z" in captured.out
+    assert "fixpoint:" in captured.out
+    assert "facts: 9, ideas: 3" in captured.out
+
+
+@pytest.mark.asyncio
+async def test_run_to_saturation_without_cache(capsys):
+    """Test that the fixpoint is reached without a cache, when a variable idea yields the same facts every round."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+
+        mock_stdin = StringIO("=> x == y\n`a == x => z\n")
+        options = {"ds": {"cache_size": 0}, "egg": {"cache_size": 0}}
+        with patch("sys.stdin", mock_stdin):
+            await asyncio.wait_for(run(addr, ["load", "ds", "egg", "dump"], options=options, saturate=True), timeout=10)
+
+    captured = capsys.readouterr()
+    assert "fact:  => z" in captured.out
+    assert "fixpoint:" in captured.out
+
+
+@pytest.mark.asyncio
+async def test_run_to_saturation_component_failure(capsys):
+    """Test that a saturating run stops and reports a component that fails before the fixpoint."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+
+        # Fail once ds is idle, so it is not cancelled in the middle of a query
+        async def broken(*args, **kwargs):
+            await asyncio.sleep(0.2)
+            raise RuntimeError("broken engine")
+
+        with patch("sys.stdin", StringIO("a => b\n=> a\n")), patch("ddss.egg.main", broken):
+            stats = await asyncio.wait_for(run(addr, ["load", "ds", "egg"], saturate=True), timeout=10)
+
+    assert stats is None
+    assert "error: component 'egg' stopped before the fixpoint: RuntimeError: broken engine" in capsys.readouterr().out
@@ -0,0 +1,91 @@
+import os
+import sys
+import subprocess
+import signal
+import asyncio
+import tempfile
+import pathlib
+import tracemalloc
+import pytest
+import pytest_asyncio
+from ddss.orm import initialize_database, insert_or_ignore_many, Facts, Ideas
+from ddss.heap import HeapReport
+from ddss.ds import main as ds
+from ddss.egg import main as egg
+
+
+@pytest_asyncio.fixture
+async def temp_db():
+    """Fixture to create a temporary database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+        engine, session = await initialize_database(addr)
+        yield addr, engine, session
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_heap_report_engines(temp_db):
+    """Test that ds and egg report the sizes of their in-memory structures."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        await insert_or_ignore_many(sess, Facts, ["a\n----\nb\n", "----\na\n", "----\n(binary == x y)\n"])
+        await insert_or_ignore_many(sess, Ideas, ["----\n(binary == y x)\n"])
+        await sess.commit()
+
+    heap = HeapReport()
+    tasks = [asyncio.create_task(component(addr, engine, session, heap=heap)) for component in (ds, egg)]
+    await asyncio.sleep(0.3)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert heap.sources["ds"]()["rules"] >= 3
+    sizes = heap.sources["egg"]()
+    assert sizes["terms"] > 0 and sizes["mapping"] > 0 and sizes["eclasses"] > 0
+    report = heap.report()
+    assert "heap: egg terms" in report
+    assert "peak rss" in report
+
+
+def test_heap_snapshot():
+    """Test that the first snapshot is a baseline and later ones write the allocation growth."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        heap = HeapReport(tmpdir)
+        try:
+            assert heap.snapshot() is None
+            data = [str(i) * 10 for i in range(10000)]
+            path = heap.snapshot()
+            assert path is not None and "test_heap.py" in path.read_text()
+            assert len(data) == 10000
+        finally:
+            tracemalloc.stop()
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="SIGUSR1 is not available")
+@pytest.mark.asyncio
+async def test_heap_signal():
+    """Test that SIGUSR1 takes snapshots while the report is running."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        heap = HeapReport(tmpdir)
+        task = asyncio.create_task(heap.run(interval=10))
+        await asyncio.sleep(0.05)
+        os.kill(os.getpid(), signal.SIGUSR1)
+        await asyncio.sleep(0.05)
+        os.kill(os.getpid(), signal.SIGUSR1)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        assert heap.snapshots == 1
+        assert len(list(pathlib.Path(tmpdir).glob("heap-*.txt"))) == 1
+        assert not tracemalloc.is_tracing()
+
+
+def test_heap_without_resource_module():
+    """Test that the command line and the heap report load on platforms without the resource module."""
+    code = "import sys\nsys.modules['resource'] = None\nimport ddss.main\nfrom ddss.heap import peak_rss\nprint(peak_rss())"
+    stdout = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    assert stdout.strip() == "0"
@@ -0,0 +1,92 @@
+import asyncio
+import socket
+import tempfile
+import pathlib
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from ddss.orm import initialize_database, Facts, Ideas
+from ddss.ingest import main
+
+
+@pytest_asyncio.fixture
+async def temp_db():
+    """Fixture to create a temporary database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+        engine, session = await initialize_database(addr)
+        yield addr, engine, session
+        await engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def send(port, text):
+    """Send text to the ingest server and return everything it answers."""
+    for _ in range(50):
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            break
+        except OSError:
+            await asyncio.sleep(0.02)
+    writer.write(text.encode())
+    writer.write_eof()
+    response = await reader.read()
+    writer.close()
+    return response.decode()
+
+
+@pytest.mark.asyncio
+async def test_ingest_from_multiple_clients(temp_db):
+    """Test that rules from several clients are parsed and stored with their ideas."""
+    addr, engine, session = temp_db
+    port = free_port()
+
+    task = asyncio.create_task(main(addr, engine, session, port=port))
+    await asyncio.gather(
+        send(port, "a => b\nc => d\n"),
+        send(port, "// comment\n\nsimple\na => b"),
+    )
+    await asyncio.sleep(0.2)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+    async with session() as sess:
+        facts = await sess.scalars(select(Facts))
+        fact_data = [f.data for f in facts]
+        assert sorted(fact_data) == ["----\nsimple\n", "a\n----\nb\n", "c\n----\nd\n"]
+
+        ideas = await sess.scalars(select(Ideas))
+        idea_data = [i.data for i in ideas]
+        assert sorted(idea_data) == ["----\na\n", "----\nc\n"]
+
+
+@pytest.mark.asyncio
+async def test_ingest_reports_errors_to_client(temp_db):
+    """Test that parse errors are answered to the client while valid lines are stored."""
+    addr, engine, session = temp_db
+    port = free_port()
+
+    task = asyncio.create_task(main(addr, engine, session, port=port))
+    response = await send(port, "=>\na => b\n")
+    await asyncio.sleep(0.2)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+    assert "error:" in response
+
+    async with session() as sess:
+        facts = await sess.scalars(select(Facts))
+        fact_data = [f.data for f in facts]
+        assert fact_data == ["a\n----\nb\n"]
@@ -232,3 +232,94 @@ async def test_input_multiple_entries(temp_db):
         idea_data = [i.data for i in ideas_list]
         assert "----\na\n" in idea_data
         assert "----\nc\n" in idea_data
+
+
+@pytest.mark.asyncio
+async def test_input_multi_line_paste(temp_db, capsys):
+    """Test that a multi-line paste is stored in one batch and summarized."""
+    addr, engine, session = temp_db
+
+    # Mock PromptSession to simulate a paste of several lines in one prompt
+    mock_prompt_session = MagicMock()
+    mock_prompt_session.prompt_async = AsyncMock(side_effect=["a => b\n=>\n// comment\nsimple\n", EOFError()])
+
+    with patch("ddss.input.PromptSession", return_value=mock_prompt_session):
+        task = asyncio.create_task(main(addr, engine, session))
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    # Check that the error and the summary were printed
+    captured = capsys.readouterr()
+    assert "error:" in captured.out
+    assert "batch: 2 rules, 1 errors" in captured.out
+
+    async with session() as sess:
+        facts = await sess.scalars(select(Facts))
+        fact_data = [f.data for f in facts]
+        assert sorted(fact_data) == ["----\nsimple\n", "a\n----\nb\n"]
+
+        ideas = await sess.scalars(select(Ideas))
+        idea_data = [i.data for i in ideas]
+        assert idea_data == ["----\na\n"]
+
+
+@pytest.mark.asyncio
+async def test_input_load_file(temp_db, capsys, tmp_path):
+    """Test that ':load file' stores every rule of the file."""
+    addr, engine, session = temp_db
+
+    path = tmp_path / "rules.txt"
+    path.write_text("a => b\nc => d\n")
+
+    # Load an existing file, then a missing one
+    mock_prompt_session = MagicMock()
+    mock_prompt_session.prompt_async = AsyncMock(
+        side_effect=[f":load {path}", f":load {tmp_path / 'missing.txt'}", EOFError()]
+    )
+
+    with patch("ddss.input.PromptSession", return_value=mock_prompt_session):
+        task = asyncio.create_task(main(addr, engine, session))
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    # Check the summary and the error for the missing file
+    captured = capsys.readouterr()
+    assert "batch: 2 rules, 0 errors" in captured.out
+    assert "error:" in captured.out
+
+    async with session() as sess:
+        facts = await sess.scalars(select(Facts))
+        fact_data = [f.data for f in facts]
+        assert sorted(fact_data) == ["a\n----\nb\n", "c\n----\nd\n"]
+
+
+@pytest.mark.asyncio
+async def test_input_load_undecodable_file(temp_db, capsys, tmp_path):
+    """Test that ':load' of a file that is not UTF-8 reports an error and keeps reading input."""
+    addr, engine, session = temp_db
+
+    path = tmp_path / "latin1.txt"
+    path.write_bytes("caf\xe9 => b\n".encode("latin-1"))
+
+    # The undecodable file is followed by a valid line
+    mock_prompt_session = MagicMock()
+    mock_prompt_session.prompt_async = AsyncMock(side_effect=[f":load {path}", "a => b", EOFError()])
+
+    with patch("ddss.input.PromptSession", return_value=mock_prompt_session):
+        task = asyncio.create_task(main(addr, engine, session))
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    captured = capsys.readouterr()
+    assert "error:" in captured.out
+    assert "codec" in captured.out
+
+    async with session() as sess:
+        facts = await sess.scalars(select(Facts))
+        assert [f.data for f in facts] == ["a\n----\nb\n"]
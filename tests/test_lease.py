@@ -0,0 +1,128 @@
+import tempfile
+import pathlib
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, update
+from ddss.orm import initialize_database, Workers
+from ddss.lease import Lease
+
+
+@pytest_asyncio.fixture
+async def temp_db():
+    """Fixture to create a temporary database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+        engine, session = await initialize_database(addr)
+        yield addr, engine, session
+        await engine.dispose()
+
+
+async def beat(session, *leases):
+    changed = []
+    for lease in leases:
+        lease.renewed = 0.0
+        async with session() as sess:
+            changed.append(await lease.heartbeat(sess))
+            await sess.commit()
+    return changed
+
+
+@pytest.mark.asyncio
+async def test_lease_single_worker_owns_everything(temp_db):
+    """Test that a lone worker registers itself and owns every partition."""
+    addr, engine, session = temp_db
+
+    lease = Lease("ds", "a", partitions=8)
+    assert await beat(session, lease) == [True]
+    assert lease.owned == set(range(8))
+    assert lease.owns("a\n----\nb\n")
+
+    async with session() as sess:
+        names = list(await sess.scalars(select(Workers.name)))
+        assert names == ["ds-a"]
+
+
+@pytest.mark.asyncio
+async def test_lease_partitions_are_disjoint_and_complete(temp_db):
+    """Test that live workers split the partitions without overlap or gaps."""
+    addr, engine, session = temp_db
+
+    first = Lease("ds", "a", partitions=8)
+    second = Lease("ds", "b", partitions=8)
+    await beat(session, first, second)
+    await beat(session, first, second)
+
+    assert first.members == second.members == ["ds-a", "ds-b"]
+    assert first.owned & second.owned == set()
+    assert first.owned | second.owned == set(range(8))
+
+
+@pytest.mark.asyncio
+async def test_lease_roles_are_independent(temp_db):
+    """Test that workers of different roles do not share partitions."""
+    addr, engine, session = temp_db
+
+    ds = Lease("ds", "a", partitions=8)
+    egg = Lease("egg", "a", partitions=8)
+    await beat(session, ds, egg)
+
+    assert ds.owned == egg.owned == set(range(8))
+
+
+@pytest.mark.asyncio
+async def test_lease_dead_worker_is_reassigned(temp_db):
+    """Test that partitions of a worker whose heartbeat expired are taken over by the survivors."""
+    addr, engine, session = temp_db
+
+    first = Lease("ds", "a", ttl=10.0, partitions=8)
+    second = Lease("ds", "b", ttl=10.0, partitions=8)
+    await beat(session, first, second)
+    await beat(session, first)
+    assert first.owned != set(range(8))
+
+    # Let the second worker's heartbeat expire
+    async with session() as sess:
+        await sess.execute(update(Workers).where(Workers.name == "ds-b").values(heartbeat=0.0))
+        await sess.commit()
+
+    assert await beat(session, first) == [True]
+    assert first.members == ["ds-a"]
+    assert first.owned == set(range(8))
+
+
+@pytest.mark.asyncio
+async def test_lease_release(temp_db):
+    """Test that releasing a lease removes the worker so others take over at once."""
+    addr, engine, session = temp_db
+
+    first = Lease("ds", "a", partitions=8)
+    second = Lease("ds", "b", partitions=8)
+    await beat(session, first, second)
+
+    async with session() as sess:
+        await second.release(sess)
+        await sess.commit()
+
+    await beat(session, first)
+    assert first.owned == set(range(8))
+
+
+@pytest.mark.asyncio
+async def test_lease_renew_commits_at_once(temp_db):
+    """Test that renewing uses its own transaction, so other workers see the heartbeat while a round is open."""
+    addr, engine, session = temp_db
+
+    first = Lease("ds", "a", partitions=8)
+    second = Lease("ds", "b", partitions=8)
+    assert await first.renew(session)
+    assert first.gained == set(range(8)) and first.lost == set()
+
+    async with session() as sess:
+        assert list(await sess.scalars(select(Workers.name))) == ["ds-a"]
+
+    await second.renew(session)
+    first.renewed = 0.0
+    assert await first.renew(session)
+    assert first.gained == set()
+    assert first.lost == second.owned
@@ -0,0 +1,27 @@
+from ddss.limit import Limits
+from ddss.utility import str_rule_get_shape
+
+
+def test_shape_of_rule():
+    """Test that depth, size and variable count cover premises and conclusion but not the separator."""
+    assert str_rule_get_shape("(f `x)\n(g (h a))\n----\n(k `x `y)\n") == (2, 12, 2)
+    assert str_rule_get_shape("----\na\n") == (0, 1, 0)
+
+
+def test_limits_disabled():
+    """Test that limits without any bound are falsy and accept everything."""
+    limits = Limits()
+    assert not limits
+    assert limits.check("----\n(s (s (s (s z))))\n") is None
+
+
+def test_limits_reject_and_count():
+    """Test that each bound rejects oversized rules and counts the reason."""
+    limits = Limits(depth=2, size=6, variables=1)
+    assert limits
+    assert limits.check("----\n(s (s z))\n") is None
+    assert limits.check("----\n(s (s (s z)))\n") == "depth"
+    assert limits.check("----\n(f a b c d e)\n") == "size"
+    assert limits.check("----\n(f `x `y)\n") == "variables"
+    assert limits.rejected == {"depth": 1, "size": 1, "variables": 1}
+    assert limits.report("ds") == "ds: rejected 3 (depth 1, size 1, variables 1)"
@@ -0,0 +1,64 @@
+import sys
+import sqlite3
+import subprocess
+from unittest.mock import AsyncMock, patch
+from ddss.main import component_map, load_component, main
+
+
+def imported_modules(code: str) -> set[str]:
+    command = [sys.executable, "-c", f"import sys\n{code}\nprint('\\n'.join(sys.modules))"]
+    return set(subprocess.run(command, check=True, capture_output=True, text=True).stdout.split())
+
+
+def test_main_imports_no_component():
+    """Test that importing the command line loads neither the components nor their heavy dependencies."""
+    modules = imported_modules("import ddss.main")
+    for name in component_map:
+        assert f"ddss.{name}" not in modules
+    for name in ["prompt_toolkit", "apyds", "apyds_bnf", "apyds_egg"]:
+        assert name not in modules
+    for name in ["sqlite", "mysql", "postgresql"]:
+        assert f"sqlalchemy.dialects.{name}" not in modules
+
+
+def test_load_component_imports_only_selected():
+    """Test that loading a component imports its own module and dependencies only."""
+    modules = imported_modules("from ddss.main import load_component\nload_component('dump')")
+    assert "ddss.dump" in modules
+    assert "apyds_bnf" in modules
+    for name in ["ddss.input", "ddss.egg", "prompt_toolkit", "apyds_egg"]:
+        assert name not in modules
+
+
+def test_load_component():
+    """Test that every component resolves to its main coroutine function."""
+    for name in component_map:
+        main = load_component(name)
+        assert main.__module__ == f"ddss.{name}"
+        assert main.__name__ == "main"
+
+
+def test_user_database_keeps_journal_mode(tmp_path):
+    """Test that a database given with --addr is not converted to WAL unless the fast profile is requested."""
+    path = tmp_path / "user.db"
+    command = [sys.executable, "-m", "ddss.main", "-a", f"sqlite:///{path.as_posix()}", "-c", "dump"]
+    subprocess.run(command, check=True, capture_output=True)
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+
+    subprocess.run([*command, "--sqlite-profile", "fast"], check=True, capture_output=True)
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+
+def test_heap_threshold_enables_heap_report():
+    """Test that --heap-threshold alone enables the heap report with the default interval."""
+    with patch("ddss.main.run", new_callable=AsyncMock) as run:
+        main(component=["dump"], heap_threshold=1000)
+    heap = run.call_args.kwargs["heap"]
+    assert heap is not None and heap.threshold == 1000
+    assert run.call_args.kwargs["heap_interval"] == 60.0
+
+    with patch("ddss.main.run", new_callable=AsyncMock) as run:
+        main(component=["dump"])
+    assert run.call_args.kwargs["heap"] is None
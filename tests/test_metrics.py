@@ -0,0 +1,182 @@
+import asyncio
+import socket
+import tempfile
+import pathlib
+from io import StringIO
+from unittest.mock import patch
+import pytest
+import pytest_asyncio
+from ddss.orm import initialize_database, insert_or_ignore_many, count_rows, Facts, Ideas
+from ddss.metrics import Metrics
+from ddss.ds import main as ds
+from ddss.egg import main as egg
+from ddss.load import main as load
+from ddss.main import run
+
+
+@pytest_asyncio.fixture
+async def temp_db():
+    """Fixture to create a temporary database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+        engine, session = await initialize_database(addr)
+        yield addr, engine, session
+        await engine.dispose()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_metrics_render():
+    """Test that counters, gauges and histograms are rendered in the Prometheus text format."""
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.inc("ddss_rows_read_total", 3, component="ds", table="facts")
+    metrics.inc("ddss_rows_read_total", component="ds", table="facts")
+    metrics.set("ddss_egraph_terms", 7)
+    metrics.observe("ddss_loop_seconds", 0.05, component="ds", phase="fetch")
+    metrics.observe("ddss_loop_seconds", 0.5, component="ds", phase="fetch")
+    metrics.observe("ddss_loop_seconds", 2.0, component="ds", phase="fetch")
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE ddss_rows_read_total counter" in lines
+    assert 'ddss_rows_read_total{component="ds",table="facts"} 4' in lines
+    assert "ddss_egraph_terms 7" in lines
+    assert "# TYPE ddss_loop_seconds histogram" in lines
+    assert 'ddss_loop_seconds_bucket{component="ds",phase="fetch",le="0.1"} 1' in lines
+    assert 'ddss_loop_seconds_bucket{component="ds",phase="fetch",le="1.0"} 2' in lines
+    assert 'ddss_loop_seconds_bucket{component="ds",phase="fetch",le="+Inf"} 3' in lines
+    assert 'ddss_loop_seconds_sum{component="ds",phase="fetch"} 2.55' in lines
+    assert 'ddss_loop_seconds_count{component="ds",phase="fetch"} 3' in lines
+
+
+@pytest.mark.asyncio
+async def test_metrics_engines(temp_db):
+    """Test that ds and egg count rows, duplicates, loop phases and the e-graph size."""
+    addr, engine, session = temp_db
+    metrics = Metrics()
+
+    async with session() as sess:
+        await insert_or_ignore_many(sess, Facts, ["a\n----\nb\n", "----\na\n", "----\n(binary == x y)\n"])
+        await insert_or_ignore_many(sess, Ideas, ["----\n(binary == y x)\n"])
+        await sess.commit()
+
+    tasks = [asyncio.create_task(component(addr, engine, session, metrics=metrics)) for component in (ds, egg)]
+    await asyncio.sleep(0.5)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    read = metrics.counters["ddss_rows_read_total"]
+    written = metrics.counters["ddss_rows_written_total"]
+    assert read[(("component", "ds"), ("table", "facts"))] >= 3
+    assert written[(("component", "ds"), ("table", "facts"))] >= 1
+    assert written[(("component", "egg"), ("table", "facts"))] >= 1
+    assert metrics.gauges["ddss_egraph_terms"][()] > 0
+    phases = {dict(labels)["phase"] for labels in metrics.histograms["ddss_loop_seconds"]}
+    assert phases == {"fetch", "fetch_ideas", "fetch_facts", "add", "rebuild", "execute", "insert", "commit"}
+
+
+@pytest.mark.asyncio
+async def test_metrics_count_ignored_inserts(temp_db):
+    """Test that inserts the database ignores are visible as written but not inserted, even without a cache."""
+    addr, engine, session = temp_db
+    metrics = Metrics()
+
+    # Without a cache, the variable idea makes egg submit the same fact every round
+    async with session() as sess:
+        await insert_or_ignore_many(sess, Facts, ["----\n(binary == a b)\n"])
+        await insert_or_ignore_many(sess, Ideas, ["----\n(binary == `x a)\n"])
+        await sess.commit()
+
+    task = asyncio.create_task(egg(addr, engine, session, cache_size=0, metrics=metrics))
+    await asyncio.sleep(0.3)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    async with session() as sess:
+        derived = await count_rows(sess, Facts) - 1
+    labels = (("component", "egg"), ("table", "facts"))
+    assert derived >= 1
+    assert metrics.counters["ddss_rows_inserted_total"][labels] == derived
+    assert metrics.counters["ddss_rows_written_total"][labels] > 1
+    assert metrics.counters["ddss_duplicates_total"][(("component", "egg"),)] == 0
+    assert metrics.gauges["ddss_egg_pool"][()] == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_load_counts_inserted_rows(temp_db):
+    """Test that load counts every parsed rule as written but only new rows as inserted."""
+    addr, engine, session = temp_db
+    metrics = Metrics()
+
+    with patch("sys.stdin", StringIO("=> a\n=> a\nb => c\n")):
+        await load(addr, engine, session, metrics=metrics)
+
+    written = metrics.counters["ddss_rows_written_total"]
+    inserted = metrics.counters["ddss_rows_inserted_total"]
+    assert written[(("component", "load"), ("table", "facts"))] == 3
+    assert inserted[(("component", "load"), ("table", "facts"))] == 2
+    assert inserted[(("component", "load"), ("table", "ideas"))] == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_serve_and_dump():
+    """Test that metrics are served over HTTP and written to a file."""
+    metrics = Metrics()
+    metrics.inc("ddss_rows_read_total", 2, component="output", table="facts")
+    port = free_port()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / "metrics.prom"
+        server = await metrics.serve("127.0.0.1", port)
+        task = asyncio.create_task(metrics.dump(str(path), interval=0.05))
+        await asyncio.sleep(0.1)
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.0\r\n\r\n")
+        response = (await reader.read()).decode()
+        writer.close()
+        assert response.startswith("HTTP/1.0 200 OK")
+        assert 'ddss_rows_read_total{component="output",table="facts"} 2' in response
+
+        server.close()
+        await server.wait_closed()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert 'ddss_rows_read_total{component="output",table="facts"} 2' in path.read_text()
+
+
+@pytest.mark.asyncio
+async def test_metrics_serve_bind_error(temp_db, capsys):
+    """Test that a metrics port already in use is reported at startup and stops the run."""
+    addr, engine, session = temp_db
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        with pytest.raises(OSError):
+            await Metrics().serve("127.0.0.1", port)
+        await asyncio.wait_for(run(addr, ["ds"], metrics=Metrics(), metrics_addr=f"127.0.0.1:{port}"), timeout=5)
+
+    assert f"error: cannot serve metrics on '127.0.0.1:{port}'" in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_metrics_dump_write_error(capsys):
+    """Test that a failed metrics write is reported and the next write is still attempted."""
+    metrics = Metrics()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / "missing" / "metrics.prom"
+        task = asyncio.create_task(metrics.dump(str(path), interval=0.02))
+        await asyncio.sleep(0.05)
+        assert "error: cannot write metrics to" in capsys.readouterr().out
+        path.parent.mkdir()
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert path.exists()
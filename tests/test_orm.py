@@ -0,0 +1,261 @@
+import asyncio
+import tempfile
+import pathlib
+from unittest.mock import patch
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, text
+from ddss.orm import (
+    initialize_database,
+    dispose_replicas,
+    insert_or_ignore,
+    insert_or_ignore_many,
+    sqlite_memory_addr,
+    load_cursor,
+    save_cursor,
+    Facts,
+)
+
+
+@pytest_asyncio.fixture
+async def temp_db():
+    """Fixture to create a temporary database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+        engine, session = await initialize_database(addr)
+        yield addr, engine, session
+        await engine.dispose()
+
+
+async def all_facts(session):
+    async with session() as sess:
+        facts = await sess.scalars(select(Facts))
+        return sorted(f.data for f in facts)
+
+
+@pytest.mark.asyncio
+async def test_insert_or_ignore_many_deduplicates(temp_db):
+    """Test that batched inserts skip duplicates both within the batch and against existing rows, and count new rows."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="----\na\n"))
+        await sess.commit()
+
+    async with session() as sess:
+        assert (
+            await insert_or_ignore_many(sess, Facts, ["----\na\n", "----\nb\n", "----\nb\n", "----\nc\n"], chunk=2) == 2
+        )
+        await sess.commit()
+
+    assert await all_facts(session) == ["----\na\n", "----\nb\n", "----\nc\n"]
+
+
+@pytest.mark.asyncio
+async def test_insert_or_ignore_generic_dialect(temp_db):
+    """Test the batched fallback used by dialects without a native insert-or-ignore statement."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="----\na\n"))
+        await sess.commit()
+
+    with patch.object(engine.dialect, "name", "generic"):
+        async with session() as sess:
+            data = ["----\na\n", "----\nb\n", "----\nb\n", "----\nc\n"]
+            assert await insert_or_ignore_many(sess, Facts, data, chunk=2) == 2
+            assert await insert_or_ignore(sess, Facts, "----\nc\n") == 0
+            assert await insert_or_ignore(sess, Facts, "----\nd\n") == 1
+            await sess.commit()
+
+    assert await all_facts(session) == ["----\na\n", "----\nb\n", "----\nc\n", "----\nd\n"]
+
+
+@pytest.mark.asyncio
+async def test_insert_or_ignore_generic_dialect_retries_on_conflict(temp_db):
+    """Test that the fallback retries when a concurrent writer inserted rows after the existence check."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="----\na\n"))
+        await sess.commit()
+
+    with patch.object(engine.dialect, "name", "generic"):
+        async with session() as sess:
+            scalars = sess.scalars
+            calls = []
+
+            # The first existence check misses the row, as if it was committed concurrently
+            async def stale_scalars(statement):
+                calls.append(statement)
+                if len(calls) == 1:
+                    return []
+                return await scalars(statement)
+
+            with patch.object(sess, "scalars", stale_scalars):
+                await insert_or_ignore_many(sess, Facts, ["----\na\n", "----\nb\n"])
+            await sess.commit()
+
+    assert len(calls) == 2
+    assert await all_facts(session) == ["----\na\n", "----\nb\n"]
+
+
+@pytest.mark.asyncio
+async def test_insert_or_ignore_generic_dialect_concurrent(temp_db):
+    """Test that concurrent fallback inserts on one session, as ds and egg used to issue them, store every row."""
+    addr, engine, session = temp_db
+
+    data = [f"----\n{i % 7}\n" for i in range(40)]
+    with patch.object(engine.dialect, "name", "generic"):
+        async with session() as sess:
+            await asyncio.gather(*(insert_or_ignore(sess, Facts, item) for item in data))
+            await sess.commit()
+
+    assert await all_facts(session) == sorted(set(data))
+
+
+@pytest.mark.asyncio
+async def test_save_cursor_upserts(temp_db):
+    """Test that sessions creating the same cursor concurrently both succeed and the last write wins."""
+    addr, engine, session = temp_db
+
+    async with session() as first, session() as second:
+        await save_cursor(first, "export", 1, 1)
+        await first.commit()
+        # The second session has not seen the first one's row
+        await save_cursor(second, "export", 2, 3)
+        await second.commit()
+
+    async with session() as sess:
+        assert await load_cursor(sess, "export") == (2, 3)
+
+
+@pytest.mark.asyncio
+async def test_save_cursor_generic_dialect_retries_on_conflict(temp_db):
+    """Test that the fallback updates the cursor when a concurrent writer created it after the update missed."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        await save_cursor(sess, "export", 1, 1)
+        await sess.commit()
+
+    with patch.object(engine.dialect, "name", "generic"):
+        async with session() as sess:
+            execute = sess.execute
+            calls = []
+
+            # The first update misses the row, as if it was committed concurrently
+            async def stale_execute(statement, *args, **kwargs):
+                calls.append(statement)
+                result = await execute(statement, *args, **kwargs)
+                if len(calls) == 1:
+                    await sess.rollback()
+                    return type("Result", (), {"rowcount": 0})()
+                return result
+
+            with patch.object(sess, "execute", stale_execute):
+                await save_cursor(sess, "export", 2, 3)
+            await sess.commit()
+
+    assert len(calls) == 3
+    async with session() as sess:
+        assert await load_cursor(sess, "export") == (2, 3)
+
+
+@pytest.mark.asyncio
+async def test_sqlite_fast_profile():
+    """Test that the fast SQLite profile enables WAL and relaxed synchronous mode on every connection."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        engine, session = await initialize_database(f"sqlite+aiosqlite:///{db_path.as_posix()}", "fast")
+        try:
+            async with session() as sess:
+                assert await sess.scalar(text("PRAGMA journal_mode")) == "wal"
+                assert await sess.scalar(text("PRAGMA synchronous")) == 1
+                assert await sess.scalar(text("PRAGMA cache_size")) == -65536
+        finally:
+            await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_memory_database_survives_dispose():
+    """Test that the shared in-memory database keeps its data when the engine pool is disposed."""
+    addr = sqlite_memory_addr("test-memory").replace("sqlite://", "sqlite+aiosqlite://")
+
+    engine, session = await initialize_database(addr, "fast")
+    async with session() as sess:
+        await insert_or_ignore(sess, Facts, "----\na\n")
+        await sess.commit()
+    await engine.dispose()
+
+    engine, session = await initialize_database(addr, "fast")
+    try:
+        assert await all_facts(session) == ["----\na\n"]
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_replica_routing():
+    """Test that reads go to a replica, writes to the primary, and reads stick to the primary right after a write."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        primary_addr = f"sqlite+aiosqlite:///{(pathlib.Path(tmpdir) / 'primary.db').as_posix()}"
+        replica_addr = f"sqlite+aiosqlite:///{(pathlib.Path(tmpdir) / 'replica.db').as_posix()}"
+
+        # The replica holds a row the primary does not have, which tells where a read was served
+        replica_engine, replica_session = await initialize_database(replica_addr)
+        async with replica_session() as sess:
+            sess.add(Facts(data="----\nreplica\n"))
+            await sess.commit()
+        await replica_engine.dispose()
+
+        engine, session = await initialize_database(primary_addr, replicas=[replica_addr], staleness=0.2)
+        try:
+            assert await all_facts(session) == ["----\nreplica\n"]
+
+            async with session() as sess:
+                await insert_or_ignore(sess, Facts, "----\nprimary\n")
+                await sess.commit()
+            assert await all_facts(session) == ["----\nprimary\n"]
+
+            await asyncio.sleep(0.2)
+            assert await all_facts(session) == ["----\nreplica\n"]
+        finally:
+            await dispose_replicas(session)
+            await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_replica_routing_pins_consistent_reads():
+    """Test that cursor reads and the fallback's existence check go to the primary even when replicas are chosen."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        primary_addr = f"sqlite+aiosqlite:///{(pathlib.Path(tmpdir) / 'primary.db').as_posix()}"
+        replica_addr = f"sqlite+aiosqlite:///{(pathlib.Path(tmpdir) / 'replica.db').as_posix()}"
+
+        # The replicas disagree with the primary: an old cursor position and a fact the primary does not have
+        replica_engine, replica_session = await initialize_database(replica_addr)
+        async with replica_session() as sess:
+            await save_cursor(sess, "export", 1, 1)
+            sess.add(Facts(data="----\na\n"))
+            await sess.commit()
+        await replica_engine.dispose()
+
+        engine, session = await initialize_database(primary_addr, replicas=[replica_addr], staleness=0)
+        try:
+            async with session() as sess:
+                await save_cursor(sess, "export", 5, 3)
+                await sess.commit()
+            async with session() as sess:
+                assert await load_cursor(sess, "export") == (5, 3)
+
+            with patch.object(engine.dialect, "name", "generic"):
+                async with session() as sess:
+                    await insert_or_ignore_many(sess, Facts, ["----\na\n"])
+                    await sess.commit()
+            async with session() as sess:
+                primary = await sess.scalars(select(Facts.data).execution_options(primary=True))
+                assert list(primary) == ["----\na\n"]
+        finally:
+            await dispose_replicas(session)
+            await engine.dispose()
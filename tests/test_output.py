@@ -111,3 +111,37 @@ async def test_output_cancellation(temp_db):
         await task
     except asyncio.CancelledError:
         pass  # Expected - cancellation worked
+
+
+@pytest.mark.asyncio
+async def test_output_resumes_from_cursor(temp_db, capsys):
+    """Test that a restarted output with the same cursor only prints rows added since the last run."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="a\n----\nb\n"))
+        sess.add(Ideas(data="x\n----\ny\n"))
+        await sess.commit()
+
+    async def run_output():
+        task = asyncio.create_task(main(addr, engine, session, cursor="console"))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return capsys.readouterr().out
+
+    captured = await run_output()
+    assert "fact: a => b" in captured
+    assert "idea: x => y" in captured
+
+    async with session() as sess:
+        sess.add(Facts(data="c\n----\nd\n"))
+        await sess.commit()
+
+    captured = await run_output()
+    assert "fact: c => d" in captured
+    assert "fact: a => b" not in captured
+    assert "idea: x => y" not in captured
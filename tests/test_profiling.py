@@ -0,0 +1,62 @@
+import asyncio
+import pstats
+import tempfile
+import pathlib
+import pytest
+import pytest_asyncio
+from ddss.orm import initialize_database, insert_or_ignore_many, Facts, Ideas
+from ddss.profiling import Profiler
+from ddss.ds import main as ds
+from ddss.egg import main as egg
+
+
+@pytest_asyncio.fixture
+async def temp_db():
+    """Fixture to create a temporary database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+        engine, session = await initialize_database(addr)
+        yield addr, engine, session
+        await engine.dispose()
+
+
+def test_profiler_iterations():
+    """Test that a component stops being profiled and is written after the given number of iterations."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        profiler = Profiler(["ds"], tmpdir, iterations=2)
+        for _ in range(2):
+            with profiler.section("ds"):
+                sum(range(1000))
+            profiler.iteration("ds")
+        assert profiler.remaining["ds"] == 0
+        assert (pathlib.Path(tmpdir) / "ds.pstats").exists()
+
+        # Sections of finished or unknown components are not profiled
+        with profiler.section("ds"), profiler.section("egg"):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_profiler_engines(temp_db):
+    """Test that ds and egg sharing one event loop can be profiled at the same time."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        await insert_or_ignore_many(sess, Facts, ["a\n----\nb\n", "----\na\n", "----\n(binary == x y)\n"])
+        await insert_or_ignore_many(sess, Ideas, ["----\n(binary == y x)\n"])
+        await sess.commit()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        profiler = Profiler(["ds", "egg"], tmpdir)
+        tasks = [asyncio.create_task(component(addr, engine, session, profiler=profiler)) for component in (ds, egg)]
+        tasks.append(asyncio.create_task(profiler.run()))
+        await asyncio.sleep(0.3)
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert not [result for result in results if not isinstance(result, asyncio.CancelledError | None)]
+
+        functions = {function for _, _, function in pstats.Stats(str(pathlib.Path(tmpdir) / "egg.pstats")).stats}
+        assert "rebuild" in functions
+        assert (pathlib.Path(tmpdir) / "ds.pstats").exists()
@@ -0,0 +1,157 @@
+import asyncio
+import tempfile
+import pathlib
+from unittest.mock import patch
+from io import StringIO
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from ddss.orm import initialize_database, fetch_after, Facts, Ideas
+from ddss.ds import main as ds
+from ddss.query import main, query
+
+
+@pytest_asyncio.fixture
+async def temp_db():
+    """Fixture to create a temporary database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+        engine, session = await initialize_database(addr)
+        yield addr, engine, session
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_query_existing_fact(temp_db):
+    """Test that a goal already present as a fact is answered and registered as an idea."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="----\na\n"))
+        await sess.commit()
+
+    answer, latency = await query(session, "----\na\n")
+    assert answer == "----\na\n"
+    assert latency >= 0
+
+    async with session() as sess:
+        ideas = list(await sess.scalars(select(Ideas.data)))
+        assert ideas == ["----\na\n"]
+
+
+@pytest.mark.asyncio
+async def test_query_waits_for_derivation(temp_db):
+    """Test that a goal derived by a running engine is answered once the fact appears."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="a\n----\nb\n"))
+        sess.add(Facts(data="----\na\n"))
+        await sess.commit()
+
+    task = asyncio.create_task(ds(addr, engine, session))
+    try:
+        answer, latency = await query(session, "----\nb\n", timeout=2.0)
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    assert answer == "----\nb\n"
+    assert latency < 2.0
+
+
+@pytest.mark.asyncio
+async def test_query_with_variables(temp_db):
+    """Test that a goal with variables is answered by a unifying fact."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="----\n(g a)\n"))
+        sess.add(Facts(data="----\n(f a)\n"))
+        await sess.commit()
+
+    answer, latency = await query(session, "----\n(f `x)\n")
+    assert answer == "----\n(f a)\n"
+
+
+@pytest.mark.asyncio
+async def test_query_with_variables_reads_new_facts_only(temp_db):
+    """Test that each poll for a goal with variables only fetches facts added since the previous poll."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="----\n(g a)\n"))
+        sess.add(Facts(data="a\n----\n(f a)\n"))
+        await sess.commit()
+
+    calls = []
+
+    async def recording_fetch_after(sess, model, after):
+        calls.append(after)
+        return await fetch_after(sess, model, after)
+
+    async def derive():
+        await asyncio.sleep(0.05)
+        async with session() as sess:
+            sess.add(Facts(data="----\n(f b)\n"))
+            await sess.commit()
+
+    with patch("ddss.query.fetch_after", recording_fetch_after):
+        task = asyncio.create_task(derive())
+        answer, latency = await query(session, "----\n(f `x)\n", timeout=1.0)
+        await task
+
+    assert answer == "----\n(f b)\n"
+    assert calls[0] == -1
+    assert set(calls[1:]) <= {2, 3}
+
+
+@pytest.mark.asyncio
+async def test_query_rejects_goal_with_premises(temp_db):
+    """Test that a goal with premises is rejected before it is registered as an idea."""
+    addr, engine, session = temp_db
+
+    with pytest.raises(ValueError):
+        await query(session, "a\n----\nb\n")
+
+    async with session() as sess:
+        assert list(await sess.scalars(select(Ideas.data))) == []
+
+
+@pytest.mark.asyncio
+async def test_query_timeout(temp_db):
+    """Test that an unanswerable goal times out with no answer."""
+    addr, engine, session = temp_db
+
+    answer, latency = await query(session, "----\nmissing\n", timeout=0.1)
+    assert answer is None
+    assert latency >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_query_component(temp_db, capsys):
+    """Test that the query component answers goals from standard input and reports latencies."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        sess.add(Facts(data="----\na\n"))
+        await sess.commit()
+
+    with patch("sys.stdin", StringIO("a\nmissing\n=>\nb => c\n")):
+        await main(addr, engine, session, timeout=0.1)
+
+    captured = capsys.readouterr()
+    assert "answer:  => a" in captured.out
+    assert "timeout:  => missing" in captured.out
+    assert "error:" in captured.out
+    assert "error: goal has premises: b => c" in captured.out
+    assert "queries: 2" in captured.out
+
+    # Goals with premises are not registered as ideas
+    async with session() as sess:
+        ideas = set(await sess.scalars(select(Ideas.data)))
+    assert ideas == {"----\na\n", "----\nmissing\n"}
@@ -0,0 +1,52 @@
+import asyncio
+import tempfile
+import pathlib
+import pytest
+from sqlalchemy import select
+from ddss.orm import initialize_database, insert_or_ignore_many, Facts, Ideas
+from ddss.record import RecordingStore, read_events
+from ddss.replay import main as replay
+from ddss.ds import main as ds
+from ddss.egg import main as egg
+
+
+async def all_data(session, model):
+    async with session() as sess:
+        return sorted(await sess.scalars(select(model.data)))
+
+
+@pytest.mark.asyncio
+async def test_record_and_replay():
+    """Test that a recorded run replayed against another database produces the same rows."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = str(pathlib.Path(tmpdir) / "run.rec")
+        addr = f"sqlite+aiosqlite:///{(pathlib.Path(tmpdir) / 'source.db').as_posix()}"
+        engine, session = await initialize_database(addr)
+
+        store = RecordingStore(session, path)
+        async with store() as sess:
+            await insert_or_ignore_many(sess, Facts, ["a\n----\nb\n", "----\na\n", "----\n(binary == x y)\n"])
+            await insert_or_ignore_many(sess, Ideas, ["----\n(binary == y x)\n"])
+            await sess.commit()
+        tasks = [asyncio.create_task(component(addr, engine, store)) for component in (ds, egg)]
+        await asyncio.sleep(0.3)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        store.close()
+
+        events = list(read_events(path))
+        assert events[0][1:] == [0, "o"]
+        assert events[1][2:] == ["w", "facts", ["a\n----\nb\n", "----\na\n", "----\n(binary == x y)\n"]]
+        assert {"r", "w", "c", "x"} <= {event[2] for event in events}
+        assert [event[0] for event in events] == sorted(event[0] for event in events)
+
+        target = f"sqlite+aiosqlite:///{(pathlib.Path(tmpdir) / 'target.db').as_posix()}"
+        target_engine, target_session = await initialize_database(target)
+        await replay(target, target_engine, target_session, path=path, speed=0)
+
+        assert "----\nb\n" in await all_data(target_session, Facts)
+        assert await all_data(target_session, Facts) == await all_data(session, Facts)
+        assert await all_data(target_session, Ideas) == await all_data(session, Ideas)
+        await engine.dispose()
+        await target_engine.dispose()
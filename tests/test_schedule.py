@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from ddss.schedule import Scheduler
+
+
+@pytest.mark.asyncio
+async def test_idle_backoff():
+    """Test that the idle delay grows exponentially up to the maximum and resets when another component writes."""
+    scheduler = Scheduler(interval=0.1, max_interval=0.4, backoff=2.0)
+    assert [scheduler.idle_delay("ds") for _ in range(5)] == [0.1, 0.2, 0.4, 0.4, 0.4]
+    scheduler.notify("egg")
+    assert scheduler.idle_delay("ds") == 0.1
+
+
+@pytest.mark.asyncio
+async def test_notify_wakes_idle_component():
+    """Test that a write by a co-hosted component ends the idle wait of the others early."""
+    scheduler = Scheduler(interval=10.0, max_interval=10.0)
+    loop = asyncio.get_running_loop()
+    begin = loop.time()
+    task = asyncio.create_task(scheduler.pause("egg", async_sessionmaker(), 0.0, 0, 0))
+    await asyncio.sleep(0.05)
+    assert not task.done()
+    await scheduler.pause("ds", async_sessionmaker(), 0.0, 3, 1, written=3)
+    await asyncio.wait_for(task, timeout=1)
+    assert loop.time() - begin < 1
+
+
+@pytest.mark.asyncio
+async def test_busy_delay_by_priority_and_depth():
+    """Test that busy components yield only to active higher-priority components, less so with a deep backlog."""
+    scheduler = Scheduler(depth=100, priorities={"output": 2.0})
+    assert scheduler.busy_delay("ds", 0.1, 0) == 0
+
+    await scheduler.pause("egg", async_sessionmaker(), 0.1, 1, 1)
+    assert scheduler.busy_delay("ds", 0.1, 0) == 0
+
+    await scheduler.pause("output", async_sessionmaker(), 0.02, 1, 1)
+    assert scheduler.busy_delay("output", 0.1, 0) == 0
+    # ds gets a third of the loop, but never yields longer than one round of output
+    assert scheduler.busy_delay("ds", 0.001, 0) == pytest.approx(0.002)
+    assert scheduler.busy_delay("ds", 0.1, 0) == pytest.approx(0.02)
+    assert scheduler.busy_delay("ds", 0.1, 50) == pytest.approx(0.01)
+    assert scheduler.busy_delay("ds", 0.1, 200) == 0
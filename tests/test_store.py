@@ -0,0 +1,304 @@
+import sys
+import asyncio
+import tempfile
+import pathlib
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, func
+from ddss.orm import (
+    initialize_database,
+    insert_or_ignore_many,
+    fetch_after,
+    count_rows,
+    load_cursor,
+    save_cursor,
+    wait_for_change,
+    Store,
+    StoreSession,
+    Facts,
+    Ideas,
+    Terms,
+)
+from ddss.store import MemoryStore, SharedStore
+from ddss.record import RecordingStore
+from ddss.ds import main as ds
+from ddss.egg import main as egg
+from ddss.output import main as output
+
+
+@pytest_asyncio.fixture
+async def temp_db():
+    """Fixture to create a temporary database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+        engine, session = await initialize_database(addr)
+        yield addr, engine, session
+        await engine.dispose()
+
+
+async def cancel(*tasks):
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["sql", "memory", "shared", "recording", "recording-memory"])
+async def test_store_interface(temp_db, backend):
+    """Test that every backend implements the store interface the components rely on."""
+    addr, engine, session = temp_db
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stores = {
+            "sql": lambda: session,
+            "memory": MemoryStore,
+            "shared": lambda: SharedStore(session),
+            "recording": lambda: RecordingStore(session, str(pathlib.Path(tmpdir) / "trace.gz")),
+            "recording-memory": lambda: RecordingStore(MemoryStore(), str(pathlib.Path(tmpdir) / "trace.gz")),
+        }
+        store = stores[backend]()
+        assert isinstance(store, Store) == (backend != "sql")
+
+        async with store() as sess:
+            assert isinstance(sess, StoreSession) == (backend != "sql")
+            assert await insert_or_ignore_many(sess, Facts, ["----\na\n", "----\nb\n", "----\na\n"]) == 2
+            assert await insert_or_ignore_many(sess, Ideas, ["----\nc\n"]) == 1
+            await save_cursor(sess, "export", 2, 1)
+            await sess.commit()
+
+        async with store() as sess:
+            assert await insert_or_ignore_many(sess, Facts, ["----\nb\n", "----\nd\n"]) == 1
+            await sess.commit()
+            assert [row.data for row in await fetch_after(sess, Facts, -1)] == ["----\na\n", "----\nb\n", "----\nd\n"]
+            assert [row.data for row in await fetch_after(sess, Facts, 2)] == ["----\nd\n"]
+            assert await count_rows(sess, Facts) == 3
+            assert await count_rows(sess, Ideas) == 1
+            assert await load_cursor(sess, "export") == (2, 1)
+            assert await load_cursor(sess, "missing") == (-1, -1)
+
+        await wait_for_change(store, 0.01)
+        if isinstance(store, RecordingStore):
+            store.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_store_deduplicates_and_commits():
+    """Test that inserts become visible on commit, are deduplicated and get increasing ids."""
+    store = MemoryStore()
+
+    async with store() as sess:
+        assert await insert_or_ignore_many(sess, Facts, ["----\na\n", "----\nb\n", "----\na\n"]) == 2
+        assert await fetch_after(sess, Facts, -1) == []
+        await sess.commit()
+
+    async with store() as sess:
+        assert await insert_or_ignore_many(sess, Facts, ["----\nb\n", "----\nc\n"]) == 1
+        await sess.commit()
+        rows = await fetch_after(sess, Facts, -1)
+        assert [(row.id, row.data) for row in rows] == [(1, "----\na\n"), (2, "----\nb\n"), (3, "----\nc\n")]
+        assert [row.data for row in await fetch_after(sess, Facts, 2)] == ["----\nc\n"]
+        assert await fetch_after(sess, Ideas, -1) == []
+
+
+@pytest.mark.asyncio
+async def test_memory_store_discards_uncommitted():
+    """Test that inserts of a session left without commit are discarded."""
+    store = MemoryStore()
+
+    async with store() as sess:
+        await insert_or_ignore_many(sess, Facts, ["----\na\n"])
+
+    assert store.data(Facts) == []
+
+
+@pytest.mark.asyncio
+async def test_memory_store_wakes_waiters():
+    """Test that a commit wakes components waiting for new rows."""
+    store = MemoryStore()
+    loop = asyncio.get_running_loop()
+
+    async def insert_later():
+        await asyncio.sleep(0.05)
+        async with store() as sess:
+            await insert_or_ignore_many(sess, Facts, ["----\na\n"])
+            await sess.commit()
+
+    begin = loop.time()
+    task = asyncio.create_task(insert_later())
+    await store.wait(5)
+    await task
+    assert loop.time() - begin < 1
+
+
+@pytest.mark.asyncio
+async def test_memory_store_cursors():
+    """Test that cursors saved through the memory store are loaded back."""
+    store = MemoryStore()
+
+    async with store() as sess:
+        assert await load_cursor(sess, "export") == (-1, -1)
+        await save_cursor(sess, "export", 2, 3)
+        assert await load_cursor(sess, "export") == (2, 3)
+
+    # Uncommitted positions are discarded like uncommitted rows
+    async with store() as sess:
+        assert await load_cursor(sess, "export") == (-1, -1)
+        await save_cursor(sess, "export", 2, 3)
+        await sess.commit()
+
+    async with store() as sess:
+        assert await load_cursor(sess, "export") == (2, 3)
+
+
+@pytest.mark.asyncio
+async def test_memory_store_engines(capsys):
+    """Test that ds, egg and output cooperate through the memory store without a database."""
+    store = MemoryStore()
+
+    async with store() as sess:
+        await insert_or_ignore_many(sess, Facts, ["a\n----\nb\n", "----\na\n", "----\n(binary == x y)\n"])
+        await insert_or_ignore_many(sess, Ideas, ["----\n(binary == y x)\n"])
+        await sess.commit()
+
+    tasks = [asyncio.create_task(component(None, store, store)) for component in (ds, egg, output)]
+    await asyncio.sleep(0.3)
+    await cancel(*tasks)
+
+    assert "----\nb\n" in store.data(Facts)
+    assert "----\n(binary == y x)\n" in store.data(Facts)
+    assert "fact:  => b" in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_memory_store_persist():
+    """Test that the memory store is persisted to a SQL database in the background."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        engine, session = await initialize_database(f"sqlite+aiosqlite:///{db_path.as_posix()}")
+        store = MemoryStore()
+
+        task = asyncio.create_task(store.persist(session, interval=0.05))
+        async with store() as sess:
+            await insert_or_ignore_many(sess, Facts, ["----\na\n"])
+            await insert_or_ignore_many(sess, Ideas, ["----\nb\n"])
+            await sess.commit()
+        await asyncio.sleep(0.2)
+
+        async with session() as sess:
+            assert list(await sess.scalars(select(Facts.data))) == ["----\na\n"]
+
+        # Rows added after the last interval are flushed on cancellation
+        async with store() as sess:
+            await insert_or_ignore_many(sess, Facts, ["----\nc\n"])
+            await sess.commit()
+        await cancel(task)
+
+        async with session() as sess:
+            assert sorted(await sess.scalars(select(Facts.data))) == ["----\na\n", "----\nc\n"]
+            assert list(await sess.scalars(select(Ideas.data))) == ["----\nb\n"]
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_shared_store_round_trip(temp_db):
+    """Test that rules are stored as shared subterms and rebuilt to the same text."""
+    addr, engine, session = temp_db
+    rules = [
+        "(f (g x) y)\n(g x)\n----------\n(h (f (g x) y))\n",
+        "----\n(g x)\n",
+        "`a\n--\n(f (g `a) y)\n",
+    ]
+
+    store = SharedStore(session)
+    async with store() as sess:
+        assert await insert_or_ignore_many(sess, Facts, rules) == 3
+        await sess.commit()
+    async with store() as sess:
+        assert await insert_or_ignore_many(sess, Facts, ["----\n(g x)\n"]) == 0
+        await sess.commit()
+        assert await count_rows(sess, Facts) == 3
+
+    # A fresh store has empty caches and rebuilds everything from the database
+    store = SharedStore(session)
+    async with store() as sess:
+        assert [row.data for row in await fetch_after(sess, Facts, -1)] == rules
+        assert [row.data for row in await fetch_after(sess, Facts, 2)] == rules[2:]
+
+    async with session() as sess:
+        terms = list(await sess.scalars(select(Terms.data)))
+        # (g x) and (f (g x) y) are stored once, although they occur several times
+        assert sum(data in ("x", "g", "y") for data in terms) == 3
+        assert await sess.scalar(select(func.count()).select_from(Facts)) == 0
+
+
+@pytest.mark.asyncio
+async def test_shared_store_small_cache(temp_db):
+    """Test that rebuilding terms does not depend on cached subterms that the same fetch evicts."""
+    addr, engine, session = temp_db
+
+    store = SharedStore(session, capacity=1)
+    async with store() as sess:
+        await insert_or_ignore_many(sess, Facts, ["----\n(g a)\n"])
+        await sess.commit()
+        assert [row.data for row in await fetch_after(sess, Facts, -1)] == ["----\n(g a)\n"]
+    async with store() as sess:
+        await insert_or_ignore_many(sess, Facts, ["----\nc\n", "----\n(f (g a))\n"])
+        await sess.commit()
+        assert sorted(row.data for row in await fetch_after(sess, Facts, 1)) == ["----\n(f (g a))\n", "----\nc\n"]
+
+
+@pytest.mark.asyncio
+async def test_shared_store_deep_terms(temp_db):
+    """Test that terms nested far beyond the recursion limit are stored and rebuilt."""
+    addr, engine, session = temp_db
+    depth = sys.getrecursionlimit() + 100
+    rule = "----\n" + "(f " * depth + "a" + ")" * depth + "\n"
+
+    store = SharedStore(session)
+    async with store() as sess:
+        assert await insert_or_ignore_many(sess, Facts, [rule]) == 1
+        await sess.commit()
+
+    # A fresh store rebuilds the term from the database, the first one partly from its cache
+    for store in (store, SharedStore(session)):
+        async with store() as sess:
+            assert [row.data for row in await fetch_after(sess, Facts, -1)] == [rule]
+
+
+@pytest.mark.asyncio
+async def test_shared_store_discards_uncommitted(temp_db):
+    """Test that inserts of a session left without commit are neither stored nor cached."""
+    addr, engine, session = temp_db
+    store = SharedStore(session)
+
+    async with store() as sess:
+        await insert_or_ignore_many(sess, Facts, ["----\n(g x)\n"])
+
+    assert store.ids == {}
+    async with store() as sess:
+        assert await fetch_after(sess, Facts, -1) == []
+
+
+@pytest.mark.asyncio
+async def test_shared_store_engines(temp_db):
+    """Test that ds and egg derive the same facts on the shared store as on plain tables."""
+    addr, engine, session = temp_db
+    store = SharedStore(session)
+
+    async with store() as sess:
+        await insert_or_ignore_many(sess, Facts, ["a\n----\nb\n", "----\na\n", "----\n(binary == x y)\n"])
+        await insert_or_ignore_many(sess, Ideas, ["----\n(binary == y x)\n"])
+        await sess.commit()
+
+    tasks = [asyncio.create_task(component(addr, engine, store)) for component in (ds, egg)]
+    await asyncio.sleep(0.5)
+    await cancel(*tasks)
+
+    async with store() as sess:
+        facts = [row.data for row in await fetch_after(sess, Facts, -1)]
+    assert "----\nb\n" in facts
+    assert "----\n(binary == y x)\n" in facts
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import tempfile
+import pathlib
+import pytest
+import pytest_asyncio
+from ddss.orm import initialize_database, insert_or_ignore_many, Facts, Ideas
+from ddss.trace import Tracer
+from ddss.ds import main as ds
+from ddss.egg import main as egg
+
+
+@pytest_asyncio.fixture
+async def temp_db():
+    """Fixture to create a temporary database."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = pathlib.Path(tmpdir) / "test.db"
+        addr = f"sqlite+aiosqlite:///{db_path.as_posix()}"
+        engine, session = await initialize_database(addr)
+        yield addr, engine, session
+        await engine.dispose()
+
+
+def test_tracer_phases():
+    """Test that consecutive stamps become spans in microseconds with their arguments."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tracer = Tracer(str(pathlib.Path(tmpdir) / "trace.json"))
+        tracer.phases("ds", [("", 1.0), ("fetch", 1.5), ("commit", 2.0)], fetch={"rows": 3})
+
+        iteration, fetch, commit = tracer.events
+        assert (iteration["name"], iteration["ts"], iteration["dur"]) == ("iteration", 1e6, 1e6)
+        assert (fetch["name"], fetch["ts"], fetch["dur"], fetch["args"]) == ("fetch", 1e6, 5e5, {"rows": 3})
+        assert (commit["name"], commit["args"]) == ("commit", {})
+        assert {event["tid"] for event in tracer.events} == {1}
+
+
+@pytest.mark.asyncio
+async def test_tracer_engines(temp_db):
+    """Test that ds and egg write a valid Chrome trace with one thread per component."""
+    addr, engine, session = temp_db
+
+    async with session() as sess:
+        await insert_or_ignore_many(sess, Facts, ["a\n----\nb\n", "----\na\n", "----\n(binary == x y)\n"])
+        await insert_or_ignore_many(sess, Ideas, ["----\n(binary == y x)\n"])
+        await sess.commit()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = pathlib.Path(tmpdir) / "trace.json"
+        tracer = Tracer(str(path))
+        tasks = [asyncio.create_task(tracer.run(interval=0.05))]
+        tasks += [asyncio.create_task(component(addr, engine, session, tracer=tracer)) for component in (ds, egg)]
+        await asyncio.sleep(0.3)
+        for task in reversed(tasks):
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        events = json.loads(path.read_text())
+
+    threads = {event["args"]["name"]: event["tid"] for event in events if event["name"] == "thread_name"}
+    assert set(threads) == {"ds", "egg"}
+    spans = {(event["cat"], event["name"]) for event in events if event["ph"] == "X"}
+    assert {("ds", "fetch"), ("ds", "add"), ("ds", "execute"), ("ds", "insert"), ("ds", "commit")} <= spans
+    assert {("egg", "fetch_ideas"), ("egg", "fetch_facts"), ("egg", "rebuild"), ("egg", "execute_idea")} <= spans
+    fetch = next(event for event in events if event["name"] == "fetch" and event["cat"] == "ds")
+    assert fetch["args"]["rows"] >= 3